@@ -1,22 +1,26 @@
+import secrets
+from dataclasses import dataclass
 from typing import Annotated, Optional
 
-import jwt
+from app import crud
 from app.core import security
 from app.core.config import settings
-from app.core.db import get_pg
-from app.core.pg_engine import PsqlEngine
+from app.core.async_pg_engine import AsyncPsqlEngine
+from app.core.cache import principal_cache
+from app.core.db import get_async_pg, get_session
 from app.models import TokenPayload, User, UserBase
 from fastapi import Cookie, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
 )
 
 
-def get_token_from_cookie(access_token: Optional[str] = Cookie(...)) -> str:
+async def get_token_from_cookie(access_token: Optional[str] = Cookie(...)) -> str:
     """
     根據 cookie 中取得 access_token, 確認為同一個登入者
     """
@@ -28,7 +32,7 @@ def get_token_from_cookie(access_token: Optional[str] = Cookie(...)) -> str:
     return access_token
 
 
-def verify_csrf_token(request: Request):
+async def verify_csrf_token(request: Request):
     """
     雙重驗證 csrf token, 從 cookie 及 headers 取出 csrf_token 比對,
     若一致才代表是同個登入者且同頁面發出的請求。
@@ -42,17 +46,15 @@ def verify_csrf_token(request: Request):
     return True
 
 
+# SQLModel 的 session, 與 AsyncPsqlEngine 共用 app.core.db 的連線池
+SessionDep = Annotated[AsyncSession, Depends(get_session)]
 TokenDep = Annotated[str, Depends(get_token_from_cookie)]
 CsrfDep = Annotated[str, Depends(verify_csrf_token)]
 
 
-def verify_access_token(token: TokenDep):
+def verify_access_token(token: TokenDep) -> TokenPayload:
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
-        )
-        token_data = TokenPayload(**payload)
-        return token_data
+        return security.decode_access_token(token)
     except (InvalidTokenError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -60,28 +62,43 @@ def verify_access_token(token: TokenDep):
         )
 
 
-TokenVerDep = Annotated[str, Depends(verify_access_token)]
+TokenVerDep = Annotated[TokenPayload, Depends(verify_access_token)]
 
 
-def get_current_user(
-    pg: Annotated[PsqlEngine, Depends(get_pg)], token: TokenDep, _: CsrfDep
-) -> User:
-    try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
-        )
-        token_data = TokenPayload(**payload)
-    except (InvalidTokenError, ValidationError):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Could not validate credentials",
-        )
-    stmt = f"""
-        select * from app.customs where customer_id = '{token_data.sub}'; 
+@dataclass(frozen=True)
+class AuthContext:
+    token: str
+    token_data: TokenPayload
+
+
+async def get_auth_context(
+    request: Request, token: TokenDep, _: CsrfDep
+) -> AuthContext:
+    """
+    cookie 的 access_token 與 csrf_token 在同一個 request 只驗證一次,
+    結果存在 request.state, 之後組合的 dependency 直接沿用
     """
-    user: UserBase = pg.execute_query(stmt, first=True)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    auth = getattr(request.state, "auth_context", None)
+    if auth is None:
+        auth = AuthContext(token=token, token_data=verify_access_token(token))
+        request.state.auth_context = auth
+    return auth
+
+
+AuthDep = Annotated[AuthContext, Depends(get_auth_context)]
+
+
+async def get_current_user(
+    pg: Annotated[AsyncPsqlEngine, Depends(get_async_pg)], auth: AuthDep
+) -> User:
+    token_data = auth.token_data
+    # 先查 process 內的使用者快取, crud 更新使用者時會失效
+    user: UserBase | None = principal_cache.get(token_data.sub)
+    if user is None:
+        user = await crud.get_user_by_customer_id(pg=pg, customer_id=token_data.sub)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        principal_cache.set(token_data.sub, user)
     if not user.activate:
         raise HTTPException(status_code=400, detail="Inactive user")
     return user
@@ -90,8 +107,34 @@ def get_current_user(
 CurrentUser = Annotated[User, Depends(get_current_user)]
 
 
+def verify_metrics_token(request: Request) -> None:
+    """
+    /metrics 由 Prometheus 抓取, 無法使用登入 cookie, 改以 METRICS_TOKEN 驗證;
+    未設定 token 時只在 local 環境開放
+    """
+    token = settings.METRICS_TOKEN
+    if token is None:
+        if settings.ENVIRONMENT == "local":
+            return
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(
+        credentials.encode(), token.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+def is_superuser(user: UserBase) -> bool:
+    # customs 資料表沒有角色欄位, 以 .env 的 FIRST_SUPERUSER 帳號作為管理員
+    return user.email.lower() == settings.FIRST_SUPERUSER.lower()
+
+
 def get_current_active_superuser(current_user: CurrentUser) -> User:
-    if not current_user.activate:
+    if not current_user.activate or not is_superuser(current_user):
         raise HTTPException(
             status_code=403, detail="The user doesn't have enough privileges"
         )
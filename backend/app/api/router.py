@@ -1,4 +1,4 @@
-from app.api.routes import cart, login, logout, production, users
+from app.api.routes import cart, images, login, logout, production, users, utils
 from app.core.config import settings
 from fastapi import APIRouter
 
@@ -10,3 +10,5 @@ if settings.ENVIRONMENT == "local":
     api_router.include_router(users.router)
     api_router.include_router(production.router)
     api_router.include_router(cart.router)
+    api_router.include_router(images.router)
+    api_router.include_router(utils.router)
@@ -0,0 +1,37 @@
+from app.core.images import IMMUTABLE, ORIGINAL, VARIANTS, image_store
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, RedirectResponse
+
+router = APIRouter(prefix="/images", tags=["images"])
+
+
+@router.get("/{variant}/{digest}/{filename}")
+async def read_image(variant: str, digest: str, filename: str, request: Request):
+    """
+    商品圖片 (app/core/images.py), 網址帶內容 hash, 回應可永久快取
+    """
+    if variant != ORIGINAL and variant not in VARIANTS:
+        raise HTTPException(status_code=404, detail="Unknown image variant")
+    source = image_store.source_path(filename)
+    if source is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    # 檔案改變時需要重新讀取整個檔案計算 hash, 不在 event loop 中執行
+    current = await run_in_threadpool(image_store.digest, source)
+    if current != digest:
+        # 圖片已更新, 導向新的網址 (導向本身不做長期快取)
+        return RedirectResponse(
+            await run_in_threadpool(image_store.url_for, filename, variant),
+            status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+            headers={"Cache-Control": "no-cache"},
+        )
+
+    etag = image_store.etag(digest, variant)
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    path = await image_store.variant_path(source, digest, variant)
+    media_type = "image/webp" if path != source else None
+    return FileResponse(path, media_type=media_type, headers=headers)
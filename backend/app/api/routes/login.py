@@ -3,17 +3,18 @@ from datetime import timedelta
 from typing import Annotated
 
 from app import crud
-from app.api.deps import CsrfDep, TokenVerDep
+from app.api.deps import AuthDep
+from app.core.admission import auth_admission
 from app.core import security
 from app.core.config import settings
-from app.core.db import get_pg
-from app.core.pg_engine import PsqlEngine
-from app.core.security import get_password_hash, verify_password
+from app.core.async_pg_engine import AsyncPsqlEngine
+from app.core.db import get_async_pg
+from app.core.email_outbox import email_outbox
+from app.core.password_pool import password_hasher
 from app.models import Message, NewPassword, NewPasswordForgot, user_email
 from app.utils import (
     generate_password_reset_token,
     generate_reset_password_email,
-    send_email,
     verify_password_reset_token,
 )
 from fastapi import APIRouter, Depends, HTTPException
@@ -24,9 +25,9 @@ router = APIRouter(prefix="/login", tags=["login"])
 
 
 # 登入路徑並回傳 JWT access-token
-@router.post("/access-token")
-def login_access_token(
-    pg: Annotated[PsqlEngine, Depends(get_pg)],
+@router.post("/access-token", dependencies=[Depends(auth_admission("login"))])
+async def login_access_token(
+    pg: Annotated[AsyncPsqlEngine, Depends(get_async_pg)],
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
 ) -> JSONResponse:
     """
@@ -36,7 +37,7 @@ def login_access_token(
     和 password Depends() 自動解析並將解析後的結果注入到 form_data 中, 稱為依賴注入
     """
     # 驗證帳號密碼
-    user = crud.authenticate(
+    user = await crud.authenticate(
         pg=pg, email=form_data.username, password=form_data.password
     )
     if not user:
@@ -51,7 +52,7 @@ def login_access_token(
     )
 
     # 更新使用者登入時間
-    crud.update_login_time(pg=pg, email=user.email)
+    await crud.update_login_time(pg=pg, email=user.email)
     # 建立 csrf_token 由 32 bytes 的隨機字串
     csrf_token = secrets.token_urlsafe(32)
     # 將 access_token 寫入 cookie 中
@@ -97,24 +98,24 @@ def login_access_token(
     return res
 
 
-@router.post("/reset-password/")
-def reset_password(
-    pg: Annotated[PsqlEngine, Depends(get_pg)],
+@router.post(
+    "/reset-password/", dependencies=[Depends(auth_admission("reset-password"))]
+)
+async def reset_password(
+    pg: Annotated[AsyncPsqlEngine, Depends(get_async_pg)],
     body: NewPassword,
-    __: TokenVerDep,
-    _: CsrfDep,  # 暫時取消
+    _: AuthDep,
 ) -> Message:
     """
     Reset password
     從正常密碼修改頁發送的重設密碼
-    TokenVerDep 依賴驗證 access_token
-    CsrfDep 依賴驗證 csrf_token
+    AuthDep 依賴驗證 access_token 及 csrf_token
     """
     email = body.email
     if not email:
         raise HTTPException(status_code=400, detail="Invalid email")
     # 根據 email 取得 user 資料
-    user = crud.get_user_by_email(pg=pg, email=email)
+    user = await crud.get_user_by_email(pg=pg, email=email)
     if not user:
         raise HTTPException(
             status_code=404,
@@ -123,25 +124,25 @@ def reset_password(
     elif not user.activate:
         raise HTTPException(status_code=400, detail="Inactive user")
     # 驗證舊密碼
-    oldpass = verify_password(body.old_password, user.password)
+    oldpass = await password_hasher.verify(body.old_password, user.password)
     if not oldpass:
         raise HTTPException(status_code=400, detail="Invalid old password.")
     # 加密新密碼
-    hashed_password = get_password_hash(password=body.new_password)
+    hashed_password = await password_hasher.hash(body.new_password)
     # 更新資料庫的密碼
-    crud.update_password(pg=pg, email=email, hashed_password=hashed_password)
+    await crud.update_password(pg=pg, email=email, hashed_password=hashed_password)
     return Message(message="Password updated successfully")
 
 
 @router.post("/password-recovery")
-def recover_password(
-    pg: Annotated[PsqlEngine, Depends(get_pg)], body: user_email
+async def recover_password(
+    pg: Annotated[AsyncPsqlEngine, Depends(get_async_pg)], body: user_email
 ) -> Message:
     """
     Password Recovery
     由忘記密碼頁請求發送重設密碼連結 email 的 api
     """
-    user = crud.get_user_by_email(pg=pg, email=body.email)
+    user = await crud.get_user_by_email(pg=pg, email=body.email)
     print(user)
     if not user:
         raise HTTPException(
@@ -152,7 +153,9 @@ def recover_password(
     email_data = generate_reset_password_email(
         email_to=user.email, email=body.email, token=password_reset_token
     )
-    send_email(
+    # 寫入 outbox 後即回應, 由背景 worker 寄出
+    await email_outbox.enqueue(
+        pg=pg,
         email_to=user.email,
         subject=email_data.subject,
         html_content=email_data.html_content,
@@ -160,9 +163,11 @@ def recover_password(
     return Message(message="Password recovery email sent")
 
 
-@router.post("/reset-password-forgot/")
-def reset_password_forgot(
-    pg: Annotated[PsqlEngine, Depends(get_pg)], body: NewPasswordForgot
+@router.post(
+    "/reset-password-forgot/", dependencies=[Depends(auth_admission("reset-password"))]
+)
+async def reset_password_forgot(
+    pg: Annotated[AsyncPsqlEngine, Depends(get_async_pg)], body: NewPasswordForgot
 ) -> Message:
     """
     Reset password
@@ -174,7 +179,7 @@ def reset_password_forgot(
     if not email:
         raise HTTPException(status_code=400, detail="Invalid token")
     # 根據 email 取得 user 資料
-    user = crud.get_user_by_email(pg=pg, email=email)
+    user = await crud.get_user_by_email(pg=pg, email=email)
     if not user:
         raise HTTPException(
             status_code=404,
@@ -183,12 +188,12 @@ def reset_password_forgot(
     elif not user.activate:
         raise HTTPException(status_code=400, detail="Inactive user")
     # 驗證舊密碼
-    oldpass = verify_password(body.old_password, user.password)
+    oldpass = await password_hasher.verify(body.old_password, user.password)
     if not oldpass:
         raise HTTPException(status_code=400, detail="Invalid old password.")
     # 加密新密碼
-    hashed_password = get_password_hash(password=body.new_password)
+    hashed_password = await password_hasher.hash(body.new_password)
     # 更新資料庫的密碼
-    crud.update_password(pg=pg, email=email, hashed_password=hashed_password)
+    await crud.update_password(pg=pg, email=email, hashed_password=hashed_password)
 
     return Message(message="Password updated successfully")
@@ -1,22 +1,20 @@
 from typing import Annotated, Any
 import ast, json
 from app import crud
-from app.api.deps import CurrentUser, verify_access_token
-from app.core import security
+from app.api.deps import CurrentUser, get_current_active_superuser, verify_access_token
+from app.core.admission import auth_admission
 from app.core.config import settings
-from app.core.pg_engine import PsqlEngine
+from app.core.async_pg_engine import AsyncPsqlEngine
+from app.core.db import get_async_pg
+from app.core.email_outbox import email_outbox
 from app.models import UserBase, UserCreate, UserUpdate
-from app.utils import generate_new_account_email, send_email
+from app.utils import generate_new_account_email, ndjson_stream
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
-def get_pg():
-    pg = PsqlEngine()
-    return pg
-
-
 # @router.get(
 #     "/",
 #     dependencies=[Depends(get_current_active_superuser)],
@@ -31,28 +29,50 @@ def get_pg():
 #     return UsersPublic(data=users, count=count)
 
 
-@router.post("/", response_model=UserCreate)
-def create_user(
-    *, pg: Annotated[PsqlEngine, Depends(get_pg)], user_in: UserCreate
+@router.get("/export", dependencies=[Depends(get_current_active_superuser)])
+async def export_users(
+    pg: Annotated[AsyncPsqlEngine, Depends(get_async_pg)],
+) -> StreamingResponse:
+    """
+    匯出所有使用者 (不含密碼), 以 NDJSON 串流回傳, 僅限管理員 (FIRST_SUPERUSER)
+    server-side cursor 逐批讀取, 使用者再多記憶體用量也固定
+    """
+    stmt = """
+        select customer_id, customer_name, email, phone_number, address,
+            pay_methods, activate, last_login, created_at, password_expiry
+        from app.customs
+        order by created_at
+    """
+    return StreamingResponse(
+        ndjson_stream(pg.iter_query(stmt)), media_type="application/x-ndjson"
+    )
+
+
+@router.post(
+    "/", response_model=UserCreate, dependencies=[Depends(auth_admission("signup"))]
+)
+async def create_user(
+    *, pg: Annotated[AsyncPsqlEngine, Depends(get_async_pg)], user_in: UserCreate
 ) -> Any:
     """
     註冊新用戶, 發送驗證信件
     """
-    user = crud.get_user_by_email(pg=pg, email=user_in.email)
+    user = await crud.get_user_by_email(pg=pg, email=user_in.email)
     if user:
         raise HTTPException(
             status_code=400,
             detail="此 Email 已存在",
         )
-    customer_id = crud.create_user(pg=pg, user_create=user_in)
+    customer_id = await crud.create_user(pg=pg, user_create=user_in)
     if settings.emails_enabled and user_in.email:
         email_data = generate_new_account_email(
             email_to=user_in.email,
             username=user_in.email,
-            password=user_in.password,
             customer_id=customer_id,
         )
-        send_email(
+        # 寫入 outbox 後即回應, 由背景 worker 寄出
+        await email_outbox.enqueue(
+            pg=pg,
             email_to=user_in.email,
             subject=email_data.subject,
             html_content=email_data.html_content,
@@ -92,7 +112,9 @@ def log():
 
 
 @router.get("/verify")
-def verify_user_from_token(token: str, pg: Annotated[PsqlEngine, Depends(get_pg)]):
+async def verify_user_from_token(
+    token: str, pg: Annotated[AsyncPsqlEngine, Depends(get_async_pg)]
+):
     """
     ✅ 信件點擊後的 GET API：僅透過 token 啟用帳號，不需要 body
     """
@@ -101,14 +123,13 @@ def verify_user_from_token(token: str, pg: Annotated[PsqlEngine, Depends(get_pg)
     json_str = json.dumps(data_dict)
     user_data = json.loads(json_str)
     user_data = UserUpdate(**user_data)
-    db_user = crud.get_user_by_email(pg=pg, email=user_data.email)
+    db_user = await crud.get_user_by_email(pg=pg, email=user_data.email)
     print(db_user)
-    if not db_user:
+    # token 由伺服器簽發並只寄到該信箱, 核對帳號即可, 不再於連結中帶密碼
+    if not db_user or db_user.customer_id != user_data.customer_id:
         raise HTTPException(status_code=404, detail="使用者不存在")
-    if not security.verify_password(user_data.password, db_user.password):
-        raise HTTPException(status_code=401, detail="密碼錯誤")
 
-    crud.update_user(pg=pg, email=user_data.email, update_data={"activate": True})
+    await crud.update_user(pg=pg, email=user_data.email, update_data={"activate": True})
     return {"message": "帳號啟用成功"}
 
 
@@ -133,7 +154,7 @@ def verify_user_from_token(token: str, pg: Annotated[PsqlEngine, Depends(get_pg)
 
 
 @router.get("/me", response_model=UserBase)
-def read_user_me(current_user: CurrentUser) -> Any:
+async def read_user_me(current_user: CurrentUser) -> Any:
     """
     Get current user's information.
     """
@@ -0,0 +1,100 @@
+from typing import Any, Literal
+
+from app.api.deps import get_current_active_superuser
+from app.core.admission import admission_control
+from app.core.cache import principal_cache
+from app.core.cart_store import cart_store
+from app.core.compression import compressed_cache
+from app.core.db import db
+from app.core.email_outbox import email_outbox
+from app.core.password_pool import password_hasher
+from app.core.query_stats import query_stats
+from app.core.security import token_claims_cache
+from fastapi import APIRouter, Depends, Query
+
+router = APIRouter(prefix="/utils", tags=["utils"])
+
+
+@router.get("/db-pool/")
+def read_db_pool_stats() -> dict[str, Any]:
+    """
+    目前 worker 的連線池狀態, 用來評估每個 worker 需要的連線數
+    """
+    return db.stats()
+
+
+@router.get("/admission/")
+def read_admission_stats() -> dict[str, Any]:
+    """
+    目前 worker 的登入/註冊流量管制: 放行與各原因拒絕的次數
+    """
+    return admission_control.stats()
+
+
+@router.get("/password-hasher/")
+def read_password_hasher_stats() -> dict[str, Any]:
+    """
+    bcrypt process pool 的排隊數量與拒絕次數
+    """
+    return password_hasher.stats()
+
+
+@router.get("/principal-cache/")
+def read_principal_cache_stats() -> dict[str, Any]:
+    """
+    get_current_user 使用者快取的命中/未命中次數
+    """
+    return principal_cache.stats()
+
+
+@router.get("/token-cache/")
+def read_token_cache_stats() -> dict[str, Any]:
+    """
+    已驗證 token claims 快取的命中/未命中次數
+    """
+    return token_claims_cache.stats()
+
+
+@router.get("/cart-store/")
+def read_cart_store_stats() -> dict[str, Any]:
+    """
+    購物車儲存模式, 記憶體中的購物車數量與寫回次數
+    """
+    return cart_store.stats()
+
+
+@router.get("/email-outbox/")
+def read_email_outbox_stats() -> dict[str, Any]:
+    """
+    背景寄信的 worker 狀態與寄出/重試/失敗次數
+    """
+    return email_outbox.stats()
+
+
+@router.get(
+    "/query-stats/", dependencies=[Depends(get_current_active_superuser)]
+)
+def read_query_stats(
+    order_by: Literal["total", "mean", "max", "p95", "count", "slow"] = "total",
+    limit: int = Query(default=50, ge=1, le=500),
+) -> list[dict[str, Any]]:
+    """
+    依 SQL 指紋彙總的執行次數與時間, 用來找出需要加索引的查詢
+    """
+    return query_stats.top(order_by=order_by, limit=limit)
+
+
+@router.post(
+    "/query-stats/reset", dependencies=[Depends(get_current_active_superuser)]
+)
+def reset_query_stats() -> dict[str, str]:
+    query_stats.reset()
+    return {"message": "Query stats reset"}
+
+
+@router.get("/compression-cache/")
+def read_compression_cache_stats() -> dict[str, Any]:
+    """
+    壓縮結果快取的命中/未命中次數
+    """
+    return compressed_cache.stats()
@@ -0,0 +1,224 @@
+'''
+驗證相關 route 的流量管制
+登入、重設密碼與註冊都要做 bcrypt (約 100~300ms CPU), 撞庫攻擊或註冊潮會讓所有 worker 忙於 bcrypt。
+這些 route 掛上 auth_admission 後, 在進入 route (也就是任何 bcrypt 之前) 依序檢查:
+  1. 同一個 IP 的 token bucket (AUTH_IP_RATE 次/分, 最多累積 AUTH_IP_BURST 次)
+  2. 同一個 email 的 token bucket (AUTH_EMAIL_RATE 次/分, 最多累積 AUTH_EMAIL_BURST 次)
+  3. 全域同時處理數上限 (每個 worker AUTH_MAX_CONCURRENT 個)
+任一項不通過即拋出 AdmissionRejected, 由 app.main 回 429 並帶 Retry-After。
+token bucket 預設存在 process 內, RATE_LIMIT_BACKEND=redis 時改用 RATE_LIMIT_REDIS_URL
+的 Redis, 讓多個 worker 共用同一組額度; Redis 無法連線時放行並記錄錯誤。
+'''
+
+import math
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Callable
+from typing import Any
+
+from fastapi import Request
+from loguru import logger
+
+from app.core.config import settings
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after: float, reason: str) -> None:
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class MemoryBucketStore:
+    """process 內的 token bucket, key 數量超過 maxsize 時淘汰最久沒用的"""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        # key -> (剩餘 token, 上次更新時間)
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """取一個 token, 成功回傳 0, 否則回傳需要等待的秒數; rate 為每秒補充的 token 數"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (float(burst), now))
+        tokens = min(float(burst), tokens + (now - updated) * rate)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+# 在 Redis 端以單一 script 完成讀取、補充與扣除, 多個 worker 同時請求也不會超發
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(data[1]) or burst
+local updated = tonumber(data[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(retry_after)
+"""
+
+
+class RedisBucketStore:
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self._client: Any = None
+        self._script: Any = None
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        if self._client is None:
+            # redis 只在使用 redis backend 時才需要安裝
+            import redis.asyncio as redis
+
+            self._client = redis.from_url(self.url)
+            self._script = self._client.register_script(TOKEN_BUCKET_LUA)
+        try:
+            result = await self._script(
+                keys=[f"admission:{key}"], args=[rate, burst, time.time()]
+            )
+        except Exception as e:
+            logger.error(f"Admission Redis backend unavailable: {e}")
+            return 0.0
+        return float(result)
+
+
+class ConcurrencyLimiter:
+    """不等待的同時處理數上限, 額滿時直接拒絕"""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.active = 0
+
+    def try_acquire(self) -> bool:
+        if self.active >= self.limit:
+            return False
+        self.active += 1
+        return True
+
+    def release(self) -> None:
+        self.active -= 1
+
+
+class AdmissionControl:
+    def __init__(self, store: Any, concurrency: int) -> None:
+        self.store = store
+        self.limiter = ConcurrencyLimiter(concurrency)
+        self._stats = {"admitted": 0, "rejected_ip": 0, "rejected_email": 0, "rejected_busy": 0}
+
+    async def check(self, scope: str, ip: str, email: str | None) -> None:
+        retry_after = await self.store.take(
+            f"{scope}:ip:{ip}", settings.AUTH_IP_RATE / 60, settings.AUTH_IP_BURST
+        )
+        if retry_after:
+            self._stats["rejected_ip"] += 1
+            raise AdmissionRejected(retry_after, "too many requests from this address")
+        if email:
+            retry_after = await self.store.take(
+                f"{scope}:email:{email.lower()}",
+                settings.AUTH_EMAIL_RATE / 60,
+                settings.AUTH_EMAIL_BURST,
+            )
+            if retry_after:
+                self._stats["rejected_email"] += 1
+                raise AdmissionRejected(retry_after, "too many requests for this account")
+        if not self.limiter.try_acquire():
+            self._stats["rejected_busy"] += 1
+            raise AdmissionRejected(1.0, "server busy")
+        self._stats["admitted"] += 1
+
+    def release(self) -> None:
+        self.limiter.release()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "backend": settings.RATE_LIMIT_BACKEND,
+            "concurrency_limit": self.limiter.limit,
+            "active": self.limiter.active,
+            **self._stats,
+        }
+
+
+def client_ip(request: Request) -> str:
+    """
+    經過 ngrok 等 proxy 時, 每一層 proxy 都把連線來源附加在 X-Forwarded-For 的最後面,
+    前面的值可由用戶端任意填寫。因此從右邊數第 RATE_LIMIT_TRUSTED_PROXIES 個才是
+    可信任的 proxy 看到的用戶端位址
+    """
+    hops = settings.RATE_LIMIT_TRUSTED_PROXIES
+    if hops > 0:
+        forwarded = [
+            ip.strip()
+            for ip in request.headers.get("x-forwarded-for", "").split(",")
+            if ip.strip()
+        ]
+        if len(forwarded) >= hops:
+            return forwarded[-hops]
+    return request.client.host if request.client else "unknown"
+
+
+async def request_email(request: Request) -> str | None:
+    """
+    從 request body 取出 email (登入表單為 username),
+    FastAPI 在執行 dependency 前已讀取並快取 body, 這裡不會重複讀取
+    """
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("application/json"):
+            data = await request.json()
+            email = data.get("email") if isinstance(data, dict) else None
+        elif content_type.startswith(
+            ("application/x-www-form-urlencoded", "multipart/form-data")
+        ):
+            email = (await request.form()).get("username")
+        else:
+            return None
+    except Exception:
+        return None
+    return email if isinstance(email, str) else None
+
+
+def create_admission_control() -> AdmissionControl:
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        store: Any = RedisBucketStore(settings.RATE_LIMIT_REDIS_URL)
+    else:
+        store = MemoryBucketStore(maxsize=settings.RATE_LIMIT_MAX_KEYS)
+    return AdmissionControl(store, concurrency=settings.AUTH_MAX_CONCURRENT)
+
+
+admission_control = create_admission_control()
+
+
+def auth_admission(scope: str) -> Callable[[Request], AsyncIterator[None]]:
+    """
+    route 的 dependency, 例如 dependencies=[Depends(auth_admission("login"))]
+    scope 區分各 route 的額度
+    """
+
+    async def dependency(request: Request) -> AsyncIterator[None]:
+        await admission_control.check(scope, client_ip(request), await request_email(request))
+        try:
+            yield
+        finally:
+            admission_control.release()
+
+    return dependency
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
@@ -0,0 +1,210 @@
+'''
+asyncio 版本的 PsqlEngine
+提供與 PsqlEngine 相同的 execute_query / execute_cmd / insert_mogrify 介面,
+讓 async route 可以直接 await, 不必為了等待 DB 佔用 threadpool 的位置。
+連線是從 app.core.db 共用的 SQLAlchemy AsyncEngine 借出底層的 psycopg 3 連線。
+'''
+
+import asyncio
+from collections.abc import AsyncIterator, Mapping
+from contextlib import asynccontextmanager
+import itertools
+import uuid
+from typing import Any, Iterable, Literal, Sequence
+
+from loguru import logger
+from psycopg import AsyncConnection
+from psycopg.rows import namedtuple_row
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.metrics import query_timer
+from app.core.query_stats import log_slow_query
+
+# server-side cursor 每次向 server 取回的筆數
+ITERSIZE = 2000
+# execute_values 對應的批次寫入筆數 (有 on_conflict 時使用)
+INSERT_PAGE_SIZE = 1000
+
+# explain_later 建立的背景工作, 保留參照避免被回收
+_background_tasks: set[asyncio.Task] = set()
+
+
+class AsyncPsqlEngine:
+    def __init__(self, engine: AsyncEngine) -> None:
+        self.engine = engine
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[AsyncConnection]:
+        """
+        從連線池借出 psycopg 連線, 正常離開時 commit, 發生例外則 rollback,
+        結束後連線歸還給 SQLAlchemy 的連線池
+        """
+        async with self.engine.connect() as sa_conn:
+            raw = await sa_conn.get_raw_connection()
+            conn: AsyncConnection = raw.driver_connection
+            try:
+                yield conn
+                await conn.commit()
+            except BaseException:
+                await conn.rollback()
+                raise
+
+    async def execute_cmd(
+        self,
+        stmt: str,
+        params: Sequence[Any] | None = None,
+        prepare: bool | None = None,
+    ) -> None:
+        try:
+            async with self.connection() as conn:
+                with query_timer("psycopg", stmt) as timing:
+                    await conn.execute(stmt, params, prepare=prepare)
+            if timing.explain:
+                self.explain_later(stmt, params, timing.elapsed)
+        except Exception as e:
+            logger.error(e)
+            logger.error(f"Error sql statement: {stmt}")
+
+    async def execute_query(
+        self,
+        stmt: str,
+        first: bool = False,
+        params: Sequence[Any] | None = None,
+        prepare: bool | None = None,
+    ) -> list[Any]:
+        """
+        params: 對應 stmt 中 %s 的參數, 不要再用 f-string 把值拼進 SQL
+        prepare: True 時以 server 端 prepared statement 執行。psycopg 3 在每條連線上
+        以 SQL 文字為 key 快取 prepared statement (conn.prepared_max 筆),
+        None 則在同一語句執行 prepare_threshold 次後自動 prepare
+        """
+        try:
+            async with self.connection() as conn:
+                async with conn.cursor(row_factory=namedtuple_row) as cursor:
+                    with query_timer("psycopg", stmt) as timing:
+                        await cursor.execute(stmt, params, prepare=prepare)
+                        result = await cursor.fetchall()
+        except Exception as e:
+            logger.error(e)
+            logger.error(f"Error sql statement: {stmt}")
+            raise
+        if timing.explain:
+            self.explain_later(stmt, params, timing.elapsed)
+        return result[0] if first and result else result
+
+    async def explain(
+        self, stmt: str, params: Sequence[Any] | Mapping[str, Any] | None = None
+    ) -> list[str]:
+        """回傳 stmt 的執行計畫 (EXPLAIN, 不實際執行)"""
+        async with self.connection() as conn:
+            cursor = await conn.execute(f"explain {stmt}", params)
+            return [row[0] for row in await cursor.fetchall()]
+
+    def explain_later(
+        self,
+        stmt: str,
+        params: Sequence[Any] | Mapping[str, Any] | None,
+        elapsed: float,
+    ) -> None:
+        """慢查詢在背景 EXPLAIN 後連同執行計畫一起記錄, 不拖慢目前的請求"""
+
+        async def _explain() -> None:
+            try:
+                plan = await self.explain(stmt, params)
+            except Exception as e:
+                plan = [f"EXPLAIN failed: {e}"]
+            log_slow_query(stmt, elapsed, plan)
+
+        try:
+            task = asyncio.get_running_loop().create_task(_explain())
+        except RuntimeError:
+            log_slow_query(stmt, elapsed, None)
+            return
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    async def iter_query(
+        self,
+        stmt: str,
+        params: Sequence[Any] | None = None,
+        itersize: int = ITERSIZE,
+    ) -> AsyncIterator[Any]:
+        """
+        以 named (server-side) cursor 逐筆讀取查詢結果, 每次只向 server 取回 itersize 筆,
+        可以直接交給 StreamingResponse (見 app.utils.ndjson_stream)。
+        迭代期間會一直佔用一條連線, 迭代結束或用戶端中斷時歸還。
+        """
+        try:
+            async with self.connection() as conn:
+                async with conn.cursor(
+                    name=f"pg_engine_iter_{uuid.uuid4().hex}",
+                    row_factory=namedtuple_row,
+                ) as cursor:
+                    cursor.itersize = itersize
+                    with query_timer("psycopg", stmt):
+                        await cursor.execute(stmt, params)
+                    async for row in cursor:
+                        yield row
+        except Exception as e:
+            logger.error(e)
+            logger.error(f"Error sql statement: {stmt}")
+            raise
+
+    async def insert_mogrify(
+        self,
+        table_name: str,
+        values: Iterable[tuple[Any, ...]],
+        on_conflict: str | None = None,
+        copy_format: Literal["text", "binary"] = "text",
+    ) -> None:
+        """
+        大量寫入資料。
+        預設以 COPY ... FROM STDIN 逐筆串流寫入, psycopg 會自行分段送出, 記憶體用量固定;
+        binary format 會先查出資料表欄位型別再送出, 省去 server 端的文字解析。
+        需要處理衝突時 (on_conflict, 例如 "on conflict do nothing") COPY 無法使用,
+        改以 executemany 每 INSERT_PAGE_SIZE 筆送出一次。
+        """
+        stmt = f"copy {table_name} from stdin"
+        try:
+            async with self.connection() as conn, conn.cursor() as cursor:
+                with query_timer("psycopg", stmt):
+                    if on_conflict:
+                        await self._insert_chunks(
+                            cursor, table_name, values, on_conflict
+                        )
+                        return
+                    types = None
+                    if copy_format == "binary":
+                        stmt += " (format binary)"
+                        await cursor.execute(
+                            """
+                            select atttypid::regtype::text from pg_attribute
+                            where attrelid = %s::regclass and attnum > 0
+                                and not attisdropped
+                            order by attnum
+                            """,
+                            (table_name,),
+                        )
+                        types = [row[0] for row in await cursor.fetchall()]
+                    async with cursor.copy(stmt) as copy:
+                        if types:
+                            copy.set_types(types)
+                        for value in values:
+                            await copy.write_row(value)
+        except Exception as e:
+            logger.error(e)
+            logger.error(f"Error sql statement: {stmt}")
+
+    async def _insert_chunks(
+        self,
+        cursor: Any,
+        table_name: str,
+        values: Iterable[tuple[Any, ...]],
+        on_conflict: str,
+    ) -> None:
+        rows = iter(values)
+        while chunk := list(itertools.islice(rows, INSERT_PAGE_SIZE)):
+            placeholders = ",".join(["%s"] * len(chunk[0]))
+            stmt = f"insert into {table_name} values ({placeholders}) {on_conflict}"
+            # psycopg 3 的 executemany 以 pipeline 模式送出
+            await cursor.executemany(stmt, chunk)
@@ -0,0 +1,106 @@
+'''
+process 內的小型 LRU + TTL 快取
+每個 worker 各自一份, 不跨 process 同步, 因此失效只影響目前的 worker,
+其他 worker 最晚在 ttl 秒後讀到新資料。
+'''
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Generic, Hashable, TypeVar
+
+from app.core.config import settings
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[K, tuple[V, float]] = OrderedDict()
+        # sync 的 dependency 會在 threadpool 中執行, 需要鎖
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: K) -> V | None:
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[0] if item else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class PrincipalCache(TTLCache[str, Any]):
+    """
+    get_current_user 查到的使用者資料, key 為 customer_id。
+    crud 的更新函式只知道 email, 因此另外記錄 email -> customer_id 以便失效。
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        super().__init__(maxsize, ttl)
+        self._email_index: dict[str, str] = {}
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        super().set(key, value, ttl)
+        with self._lock:
+            self._email_index[value.email] = key
+            # email 索引只保留仍在快取中的使用者
+            if len(self._email_index) > self.maxsize * 2:
+                self._email_index = {
+                    v.email: k for k, (v, _) in self._data.items()
+                }
+
+    def invalidate_email(self, email: str) -> None:
+        with self._lock:
+            customer_id = self._email_index.pop(email, None)
+        if customer_id is not None:
+            self.pop(customer_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._email_index.clear()
+        super().clear()
+
+
+principal_cache = PrincipalCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE, ttl=settings.PRINCIPAL_CACHE_TTL
+)
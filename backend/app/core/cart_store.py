@@ -0,0 +1,530 @@
+'''
+購物車儲存層
+cart route 只透過 CartStore 操作購物車, 依 .env 的 CART_STORE_MODE 選擇實作:
+  database     : 每次異動都直接寫入 app.orders / app.order_items (預設)
+  write_behind : 未結帳的購物車放在 process 內記憶體, 每 CART_FLUSH_INTERVAL 秒
+                 把有異動的購物車批次寫回 Postgres, 結帳時立即寫回
+  checkout     : 只在結帳、閒置淘汰與關機時寫回, 寫入量最少, 但 process 異常結束會遺失未寫回的異動
+記憶體模式下購物車只存在於單一 worker, 多 worker 部署 (python -m app.serve) 只能使用 database 模式。
+所有方法回傳 CartResponse 格式的 JSON 字串, 購物車不存在時回傳 None。
+'''
+
+import asyncio
+import time
+import weakref
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+
+import orjson
+from loguru import logger
+from sqlalchemy import delete, literal, text, update
+from sqlalchemy import select as sa_select
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import col
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.db import db, get_async_pg
+from app.models import CartItemCreate, Order, OrderItem
+
+# 以單一查詢在 Postgres 組出 CartResponse 的 JSON (購物車與所有商品),
+# 不經過 ORM lazy load 與 pydantic 逐筆驗證; {source} 為提供購物車資料列 o 的 FROM 子句
+CART_JSON = """
+    select json_build_object(
+        'order_id', o.order_id,
+        'customer_id', o.customer_id,
+        'customer_name', o.customer_name,
+        'status', o.status,
+        'total_amount', o.total_amount,
+        'comment', o.comment,
+        'items', coalesce(
+            (
+                select json_agg(
+                    json_build_object(
+                        'id', i.id,
+                        'order_id', i.order_id,
+                        'license_id', i.license_id,
+                        'license_name', i.license_name,
+                        'quantity', i.quantity,
+                        'price_at_order_time', i.price_at_order_time,
+                        'created_by', i.created_by,
+                        'created_date', i.created_date
+                    )
+                    order by i.id
+                )
+                from app.order_items i
+                where i.order_id = o.order_id
+            ),
+            '[]'::json
+        )
+    )::text
+    from {source}
+"""
+
+OPEN_CART_JSON = text(
+    CART_JSON.format(
+        source="app.orders o where o.customer_id = :customer_id and o.status"
+    )
+)
+
+CHECKOUT_CART_JSON = text(
+    """
+    with o as (
+        update app.orders
+        set status = false, updated_date = :now, comment = :comment
+        where customer_id = :customer_id and status
+        returning *
+    )
+    """
+    + CART_JSON.format(source="o")
+)
+
+
+# 記憶體模式一次向 order_items 的 sequence 預先取得的商品 id 數量
+ITEM_ID_BLOCK = 100
+
+
+class CartStore(ABC):
+    @abstractmethod
+    async def add_item(
+        self, customer_id: str, customer_name: str, item: CartItemCreate
+    ) -> str | None: ...
+
+    @abstractmethod
+    async def get(self, customer_id: str) -> str | None: ...
+
+    @abstractmethod
+    async def remove_item(self, customer_id: str, item_id: int) -> bool: ...
+
+    @abstractmethod
+    async def checkout(self, customer_id: str) -> str | None: ...
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    def stats(self) -> dict[str, Any]:
+        return {"mode": settings.CART_STORE_MODE}
+
+
+class DatabaseCartStore(CartStore):
+    """每次異動都直接寫入資料庫"""
+
+    def session(self) -> AsyncSession:
+        return AsyncSession(db.get_engine(), expire_on_commit=False)
+
+    async def add_item(
+        self, customer_id: str, customer_name: str, item: CartItemCreate
+    ) -> str | None:
+        """
+        單一 SQL 完成: 以 ux_orders_open_cart (customer_id WHERE status) upsert 未結帳的購物車,
+        總金額在 SQL 中累加, 再寫入商品。同一位客戶同時加入多筆商品也不會產生
+        兩台購物車或覆蓋掉彼此的總金額。
+        """
+        now = datetime.now()
+        upsert = insert(Order).values(
+            customer_id=customer_id,
+            customer_name=customer_name,
+            status=True,
+            total_amount=item.quantity * item.price_at_order_time,
+            comment="新購物車",
+            created_date=now,
+            updated_date=now,
+        )
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[Order.customer_id],
+            index_where=col(Order.status),
+            set_={
+                "total_amount": Order.total_amount + upsert.excluded.total_amount,
+                "updated_date": upsert.excluded.updated_date,
+            },
+        ).returning(Order.order_id)
+        cart = upsert.cte("cart")
+
+        # 新增商品到購物車
+        add_item = insert(OrderItem).from_select(
+            [
+                "order_id",
+                "license_id",
+                "license_name",
+                "quantity",
+                "price_at_order_time",
+                "created_by",
+                "created_date",
+            ],
+            sa_select(
+                cart.c.order_id,
+                literal(item.license_id),
+                literal(item.license_name),
+                literal(item.quantity),
+                literal(item.price_at_order_time),
+                literal(item.created_by),
+                literal(now),
+            ),
+        )
+        async with self.session() as session:
+            await session.exec(add_item)
+            await session.commit()
+            return (
+                await session.exec(OPEN_CART_JSON.bindparams(customer_id=customer_id))
+            ).scalar()
+
+    async def get(self, customer_id: str) -> str | None:
+        """取得客戶未結帳的購物車 (status=True) 及所有商品, 一次查詢"""
+        async with self.session() as session:
+            return (
+                await session.exec(OPEN_CART_JSON.bindparams(customer_id=customer_id))
+            ).scalar()
+
+    async def remove_item(self, customer_id: str, item_id: int) -> bool:
+        """
+        刪除商品與扣除總金額在同一個 SQL 完成, 與 add_item 同時執行時總金額仍正確
+        """
+        open_cart = (
+            sa_select(Order.order_id)
+            .where(Order.customer_id == customer_id, col(Order.status))
+            .scalar_subquery()
+        )
+        removed = (
+            delete(OrderItem)
+            .where(col(OrderItem.id) == item_id, col(OrderItem.order_id) == open_cart)
+            .returning(
+                OrderItem.order_id,
+                (OrderItem.quantity * OrderItem.price_at_order_time).label("amount"),
+            )
+            .cte("removed")
+        )
+        statement = (
+            update(Order)
+            .where(col(Order.order_id) == removed.c.order_id)
+            .values(
+                total_amount=Order.total_amount - removed.c.amount,
+                updated_date=datetime.now(),
+            )
+            .returning(Order.order_id)
+        )
+        async with self.session() as session:
+            result = (await session.exec(statement)).first()
+            await session.commit()
+        return result is not None
+
+    async def checkout(self, customer_id: str) -> str | None:
+        # 標記購物車為已結帳, 並在同一個查詢回傳結帳後的購物車
+        now = datetime.now()
+        async with self.session() as session:
+            body = (
+                await session.exec(
+                    CHECKOUT_CART_JSON.bindparams(
+                        customer_id=customer_id, now=now, comment=f"訂單於 {now} 完成"
+                    )
+                )
+            ).scalar()
+            await session.commit()
+        return body
+
+
+@dataclass
+class MemoryCart:
+    order_id: int
+    customer_id: str
+    customer_name: str
+    total_amount: int
+    comment: str
+    items: dict[int, dict[str, Any]] = field(default_factory=dict)
+    dirty: bool = False
+    touched_at: float = field(default_factory=time.monotonic)
+    updated_date: datetime = field(default_factory=datetime.now)
+
+    @classmethod
+    def from_json(cls, body: str) -> "MemoryCart":
+        data = orjson.loads(body)
+        items = {item["id"]: item for item in data["items"]}
+        return cls(
+            order_id=data["order_id"],
+            customer_id=data["customer_id"],
+            customer_name=data["customer_name"],
+            total_amount=data["total_amount"],
+            comment=data["comment"],
+            items=items,
+        )
+
+    def to_json(self) -> str:
+        # orjson 的 datetime 格式 (ISO 8601) 與 Postgres json 一致
+        return orjson.dumps(
+            {
+                "order_id": self.order_id,
+                "customer_id": self.customer_id,
+                "customer_name": self.customer_name,
+                "status": True,
+                "total_amount": self.total_amount,
+                "comment": self.comment,
+                "items": list(self.items.values()),
+            }
+        ).decode()
+
+    def touch(self) -> None:
+        self.dirty = True
+        self.touched_at = time.monotonic()
+        self.updated_date = datetime.now()
+
+
+class MemoryCartStore(CartStore):
+    """
+    未結帳的購物車保存在記憶體, 異動只改記憶體並標記 dirty, 由背景工作批次寫回。
+    建立購物車時會先在資料庫 upsert 一筆空的 app.orders 以取得 order_id。
+    商品 id 預先從 app.order_items 的 sequence 批次取得, 寫回時以相同 id 覆寫整台購物車的
+    app.order_items, 閒置淘汰後重新載入或結帳後, 用戶端拿到的 id 仍然有效。
+    同一位客戶的操作以 lock 依序執行; 寫回資料庫 (背景寫回與結帳) 也依序執行, 不會互相覆蓋。
+    """
+
+    def __init__(self, mode: str, flush_interval: float, idle_ttl: float) -> None:
+        self.mode = mode
+        self.flush_interval = flush_interval
+        self.idle_ttl = idle_ttl
+        self._carts: dict[str, MemoryCart] = {}
+        # 同一位客戶同時第一次存取時, 只讓一個請求去資料庫載入/建立購物車
+        self._locks: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+            weakref.WeakValueDictionary()
+        )
+        self._write_lock = asyncio.Lock()
+        self._item_ids: deque[int] = deque()
+        self._item_id_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._flushes = 0
+        self._flushed_carts = 0
+
+    async def _load(self, customer_id: str) -> MemoryCart | None:
+        body = await DatabaseCartStore().get(customer_id)
+        return MemoryCart.from_json(body) if body else None
+
+    async def _create(self, customer_id: str, customer_name: str) -> MemoryCart:
+        now = datetime.now()
+        row = await get_async_pg().execute_query(
+            """
+            insert into app.orders
+                (customer_id, customer_name, status, total_amount, comment,
+                 created_date, updated_date)
+            values (%s, %s, true, 0, %s, %s, %s)
+            on conflict (customer_id) where status
+            do update set updated_date = excluded.updated_date
+            returning order_id, total_amount
+            """,
+            first=True,
+            params=(customer_id, customer_name, "新購物車", now, now),
+        )
+        return MemoryCart(
+            order_id=row.order_id,
+            customer_id=customer_id,
+            customer_name=customer_name,
+            total_amount=row.total_amount,
+            comment="新購物車",
+        )
+
+    def _lock(self, customer_id: str) -> asyncio.Lock:
+        return self._locks.setdefault(customer_id, asyncio.Lock())
+
+    async def _get_cart(
+        self, customer_id: str, customer_name: str | None = None
+    ) -> MemoryCart | None:
+        """呼叫端需持有該客戶的 lock"""
+        cart = self._carts.get(customer_id)
+        if cart is None:
+            cart = await self._load(customer_id)
+            if cart is None and customer_name is not None:
+                cart = await self._create(customer_id, customer_name)
+            if cart is not None:
+                self._carts[customer_id] = cart
+        return cart
+
+    async def _next_item_id(self) -> int:
+        if not self._item_ids:
+            async with self._item_id_lock:
+                if not self._item_ids:
+                    rows = await get_async_pg().execute_query(
+                        """
+                        select nextval(pg_get_serial_sequence('app.order_items', 'id')) as id
+                        from generate_series(1, %s)
+                        """,
+                        params=(ITEM_ID_BLOCK,),
+                    )
+                    self._item_ids.extend(row.id for row in rows)
+        return self._item_ids.popleft()
+
+    async def add_item(
+        self, customer_id: str, customer_name: str, item: CartItemCreate
+    ) -> str | None:
+        item_id = await self._next_item_id()
+        async with self._lock(customer_id):
+            cart = await self._get_cart(customer_id, customer_name)
+            # 取得購物車之後沒有 await, 異動期間不會被背景工作淘汰
+            cart.items[item_id] = {
+                "id": item_id,
+                "order_id": cart.order_id,
+                **item.model_dump(),
+                "created_date": datetime.now(),
+            }
+            cart.total_amount += item.quantity * item.price_at_order_time
+            cart.touch()
+            return cart.to_json()
+
+    async def get(self, customer_id: str) -> str | None:
+        async with self._lock(customer_id):
+            cart = await self._get_cart(customer_id)
+            if cart is None:
+                return None
+            cart.touched_at = time.monotonic()
+            return cart.to_json()
+
+    async def remove_item(self, customer_id: str, item_id: int) -> bool:
+        async with self._lock(customer_id):
+            cart = await self._get_cart(customer_id)
+            if cart is None or item_id not in cart.items:
+                return False
+            item = cart.items.pop(item_id)
+            cart.total_amount -= item["quantity"] * item["price_at_order_time"]
+            cart.touch()
+            return True
+
+    async def checkout(self, customer_id: str) -> str | None:
+        # 持有客戶的 lock 直到結帳完成, 期間的 add_item 會等結帳後建立新的購物車
+        async with self._lock(customer_id):
+            cart = await self._get_cart(customer_id)
+            if cart is None:
+                return None
+            # 先把購物車寫回 (並等待進行中的背景寫回), 再由資料庫完成結帳;
+            # 寫回失敗時購物車仍留在記憶體, 由背景工作重試
+            async with self._write_lock:
+                if cart.dirty:
+                    await self._write_unlocked([cart])
+                body = await DatabaseCartStore().checkout(customer_id)
+            self._carts.pop(customer_id, None)
+            return body
+
+    async def _write(self, carts: list[MemoryCart]) -> None:
+        async with self._write_lock:
+            # 等待期間可能已結帳或已由其他寫回處理
+            carts = [
+                cart
+                for cart in carts
+                if cart.dirty and self._carts.get(cart.customer_id) is cart
+            ]
+            if carts:
+                await self._write_unlocked(carts)
+
+    async def _write_unlocked(self, carts: list[MemoryCart]) -> None:
+        """把購物車整台覆寫回資料庫, 同一個交易完成; 呼叫端需持有 _write_lock"""
+        order_ids = [cart.order_id for cart in carts]
+        items = [
+            (
+                item["id"],
+                cart.order_id,
+                item["license_id"],
+                item["license_name"],
+                item["quantity"],
+                item["price_at_order_time"],
+                item["created_by"],
+                item["created_date"],
+            )
+            for cart in carts
+            for item in cart.items.values()
+        ]
+        for cart in carts:
+            cart.dirty = False
+        try:
+            async with get_async_pg().connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.executemany(
+                        """
+                        update app.orders set total_amount = %s, updated_date = %s
+                        where order_id = %s
+                        """,
+                        [(c.total_amount, c.updated_date, c.order_id) for c in carts],
+                    )
+                    await cursor.execute(
+                        "delete from app.order_items where order_id = any(%s)",
+                        (order_ids,),
+                    )
+                    if items:
+                        await cursor.executemany(
+                            """
+                            insert into app.order_items
+                                (id, order_id, license_id, license_name, quantity,
+                                 price_at_order_time, created_by, created_date)
+                            values (%s, %s, %s, %s, %s, %s, %s, %s)
+                            """,
+                            items,
+                        )
+        except Exception:
+            # 寫回失敗則保留 dirty, 下次再試
+            for cart in carts:
+                cart.dirty = True
+            raise
+        self._flushes += 1
+        self._flushed_carts += len(carts)
+
+    async def flush(self, only_idle: bool = False) -> None:
+        now = time.monotonic()
+        idle = [
+            cart
+            for cart in self._carts.values()
+            if now - cart.touched_at >= self.idle_ttl
+        ]
+        if only_idle:
+            dirty = [cart for cart in idle if cart.dirty]
+        else:
+            dirty = [cart for cart in self._carts.values() if cart.dirty]
+        for start in range(0, len(dirty), settings.CART_FLUSH_BATCH_SIZE):
+            await self._write(dirty[start : start + settings.CART_FLUSH_BATCH_SIZE])
+        # 閒置且已寫回的購物車移出記憶體
+        for cart in idle:
+            if not cart.dirty and self._carts.get(cart.customer_id) is cart:
+                del self._carts[cart.customer_id]
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush(only_idle=self.mode == "checkout")
+            except Exception as e:
+                logger.error(f"Cart flush failed: {e}")
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "carts": len(self._carts),
+            "dirty": sum(cart.dirty for cart in self._carts.values()),
+            "flushes": self._flushes,
+            "flushed_carts": self._flushed_carts,
+        }
+
+
+def create_cart_store() -> CartStore:
+    if settings.CART_STORE_MODE == "database":
+        return DatabaseCartStore()
+    return MemoryCartStore(
+        mode=settings.CART_STORE_MODE,
+        flush_interval=settings.CART_FLUSH_INTERVAL,
+        idle_ttl=settings.CART_IDLE_TTL,
+    )
+
+
+cart_store = create_cart_store()
+
+
+def get_cart_store() -> CartStore:
+    return cart_store
@@ -0,0 +1,80 @@
+'''
+商品目錄快取
+GET /production 的回應在 process 內快取 CATALOG_CACHE_TTL 秒, 快取的是已經序列化好的
+JSON bytes 與其 strong ETag。命中快取時不查 DB 也不重新序列化,
+帶 If-None-Match 的請求直接回 304。
+每個 worker 各自一份, 不跨 process 同步, 因此 invalidate 只清除目前的 worker,
+其他 worker 最晚在 CATALOG_CACHE_TTL 秒後讀到新資料 (期間仍回傳舊的目錄與 ETag)。
+'''
+
+import asyncio
+import hashlib
+import time
+from collections.abc import Awaitable, Callable, Sequence
+from dataclasses import dataclass
+
+from app.core.config import settings
+from app.core.serialization import production_list_adapter
+from app.models import Production
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    body: bytes
+    etag: str
+    expires_at: float
+
+    def matches(self, if_none_match: str | None) -> bool:
+        """If-None-Match 比對 (RFC 9110 使用 weak comparison)"""
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*" or tag.removeprefix("W/") == self.etag:
+                return True
+        return False
+
+
+def build_entry(rows: Sequence[Production], ttl: float) -> CatalogEntry:
+    body = production_list_adapter.dump_json(list(rows))
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    return CatalogEntry(body=body, etag=etag, expires_at=time.monotonic() + ttl)
+
+
+class CatalogCache:
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self._entry: CatalogEntry | None = None
+        # 快取失效時只讓一個請求去查 DB, 其他請求等它完成
+        self._lock = asyncio.Lock()
+        # invalidate() 時遞增, 避免在重新載入期間被失效的舊資料寫回快取
+        self._generation = 0
+
+    def peek(self) -> CatalogEntry | None:
+        entry = self._entry
+        if entry is not None and entry.expires_at > time.monotonic():
+            return entry
+        return None
+
+    async def get(
+        self, loader: Callable[[], Awaitable[Sequence[Production]]]
+    ) -> CatalogEntry:
+        entry = self.peek()
+        if entry is not None:
+            return entry
+        async with self._lock:
+            entry = self.peek()
+            if entry is not None:
+                return entry
+            generation = self._generation
+            entry = build_entry(await loader(), self.ttl)
+            if generation == self._generation:
+                self._entry = entry
+            return entry
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._entry = None
+
+
+catalog_cache = CatalogCache(ttl=settings.CATALOG_CACHE_TTL)
@@ -0,0 +1,193 @@
+'''
+回應壓縮
+CompressionMiddleware 依 Accept-Encoding 選擇 br (brotli) 或 gzip 壓縮 JSON / 文字回應:
+  - 小於 COMPRESSION_MIN_SIZE bytes 的回應不壓縮 (壓縮省下的傳輸量比不上 CPU 成本)
+  - 壓縮等級由 COMPRESSION_GZIP_LEVEL / COMPRESSION_BROTLI_QUALITY 設定
+  - 帶 ETag 的回應 (例如 GET /production 商品目錄) 以 (path, ETag, encoding) 為 key
+    快取壓縮後的結果, 內容不變時只壓縮一次
+  - 串流回應 (StreamingResponse、FileResponse) 與已壓縮的回應不處理
+壓縮後的 ETag 改為 weak (W/"..."), If-None-Match 的比對不受影響。
+可壓縮類型的回應不論這次是否壓縮都帶 Vary: Accept-Encoding, 讓 ngrok / CDN 等共用快取依編碼分開存放。
+未安裝 brotli 時只提供 gzip。
+'''
+
+import gzip
+import importlib.util
+from typing import Any
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+HAS_BROTLI = importlib.util.find_spec("brotli") is not None
+
+
+def parse_accept_encoding(header: str) -> dict[str, float]:
+    """Accept-Encoding: "br;q=1.0, gzip;q=0.8, *;q=0.1" -> {"br": 1.0, "gzip": 0.8, "*": 0.1}"""
+    result: dict[str, float] = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        result[coding] = q
+    return result
+
+
+def choose_encoding(header: str) -> str | None:
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get("*", 0.0)
+    candidates = ["br", "gzip"] if HAS_BROTLI else ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = accepted.get(coding, wildcard)
+        # q 相同時依 candidates 順序, 優先使用壓縮率較好的 br
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        import brotli
+
+        return brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def add_accept_encoding(vary: bytes) -> bytes:
+    if b"accept-encoding" in vary.lower() or vary.strip() == b"*":
+        return vary
+    return vary + b", Accept-Encoding" if vary else b"Accept-Encoding"
+
+
+def with_vary(start: dict[str, Any]) -> dict[str, Any]:
+    """
+    可壓縮類型且尚未編碼的回應加上 Vary: Accept-Encoding,
+    同一個網址的未壓縮與壓縮版本才不會被共用快取混用
+    """
+    headers = start.get("headers", [])
+    lowered = {k.lower(): v for k, v in headers}
+    content_type = lowered.get(b"content-type", b"").decode("latin-1")
+    if b"content-encoding" in lowered or not content_type.startswith(COMPRESSIBLE_TYPES):
+        return start
+    vary = add_accept_encoding(lowered.get(b"vary", b""))
+    if vary == lowered.get(b"vary"):
+        return start
+    headers = [(k, v) for k, v in headers if k.lower() != b"vary"]
+    return {**start, "headers": headers + [(b"vary", vary)]}
+
+
+# (path, etag, encoding) -> 壓縮後的 body
+compressed_cache: TTLCache[tuple[str, str, str], bytes] = TTLCache(
+    maxsize=settings.COMPRESSION_CACHE_SIZE, ttl=settings.COMPRESSION_CACHE_TTL
+)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: Any, minimum_size: int = settings.COMPRESSION_MIN_SIZE) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+
+            async def send_with_vary(message: dict[str, Any]) -> None:
+                if message["type"] == "http.response.start":
+                    message = with_vary(message)
+                await send(message)
+
+            await self.app(scope, receive, send_with_vary)
+            return
+
+        start: dict[str, Any] | None = None
+        passthrough = False
+
+        async def send_wrapper(message: dict[str, Any]) -> None:
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+            body = message.get("body", b"")
+            # 串流回應或不適合壓縮的回應原樣送出
+            if message.get("more_body", False) or not self._should_compress(start, body):
+                passthrough = True
+                await send(with_vary(start))
+                await send(message)
+                return
+            await self._send_compressed(scope, start, body, encoding, send)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _should_compress(self, start: dict[str, Any], body: bytes) -> bool:
+        if len(body) < self.minimum_size:
+            return False
+        headers = {k.lower(): v for k, v in start.get("headers", [])}
+        if b"content-encoding" in headers:
+            return False
+        if b"no-transform" in headers.get(b"cache-control", b""):
+            return False
+        content_type = headers.get(b"content-type", b"").decode("latin-1")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    async def _send_compressed(
+        self,
+        scope: dict[str, Any],
+        start: dict[str, Any],
+        body: bytes,
+        encoding: str,
+        send: Any,
+    ) -> None:
+        headers = [
+            (k, v)
+            for k, v in start.get("headers", [])
+            if k.lower() not in (b"content-length", b"etag", b"vary")
+        ]
+        original = {k.lower(): v for k, v in start.get("headers", [])}
+        etag = original.get(b"etag", b"").decode("latin-1")
+
+        compressed = None
+        key = (scope["path"], etag, encoding)
+        if etag:
+            compressed = compressed_cache.get(key)
+        if compressed is None:
+            compressed = compress(body, encoding)
+            if etag:
+                compressed_cache.set(key, compressed)
+
+        if etag:
+            weak = etag if etag.startswith("W/") else f"W/{etag}"
+            headers.append((b"etag", weak.encode("latin-1")))
+        headers += [
+            (b"vary", add_accept_encoding(original.get(b"vary", b""))),
+            (b"content-encoding", encoding.encode()),
+            (b"content-length", str(len(compressed)).encode()),
+        ]
+        await send({**start, "headers": headers})
+        await send({"type": "http.response.body", "body": compressed})
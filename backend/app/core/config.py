@@ -64,6 +64,101 @@ class Settings(BaseSettings):
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str = ""
     POSTGRES_DB: str = ""
+    # psycopg2 連線池設定 (每個 worker process 各自一個連線池)
+    PG_POOL_MIN_SIZE: int = 1
+    PG_POOL_MAX_SIZE: int = 10
+    # 借連線的等待上限 (秒)
+    PG_POOL_TIMEOUT: float = 30.0
+    # 閒置超過此秒數的連線, 借出前先檢查是否可用
+    PG_POOL_MAX_IDLE: float = 60.0
+
+    # 正式環境多 worker 啟動 (python -m app.serve)
+    # worker 數量, 0 表示依可用 CPU 數
+    SERVE_WORKERS: int = 0
+    # 所有 worker 合計的資料庫連線上限, 每個 worker 的 PG_POOL_MAX_SIZE 由此平分
+    DB_CONNECTION_BUDGET: int = 40
+    # 每個 worker 處理這麼多請求後重啟 (0 表示不重啟), 加上隨機 jitter 避免同時重啟
+    SERVE_MAX_REQUESTS: int = 10_000
+    SERVE_MAX_REQUESTS_JITTER: int = 1_000
+    # 收到 SIGTERM 後等待處理中請求完成的秒數
+    SERVE_GRACEFUL_TIMEOUT: float = 30.0
+    # lifespan 啟動時建立資料表與索引; app.serve 在 fork 前執行一次後, 對 worker 設為 false
+    DB_INIT_ON_STARTUP: bool = True
+
+    # bcrypt process pool: process 數量與最多排隊的 hash/verify 數量
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 32
+
+    # 登入/重設密碼/註冊的流量管制 (app/core/admission.py)
+    # 每個 IP、每個 email 每分鐘可用次數與最多累積次數
+    AUTH_IP_RATE: float = 20.0
+    AUTH_IP_BURST: int = 10
+    AUTH_EMAIL_RATE: float = 5.0
+    AUTH_EMAIL_BURST: int = 5
+    # 每個 worker 同時處理的上限, 超過時直接回 429
+    AUTH_MAX_CONCURRENT: int = 16
+    # token bucket 存放位置: memory (每個 worker 各自計算) / redis (所有 worker 共用)
+    RATE_LIMIT_BACKEND: Literal["memory", "redis"] = "memory"
+    RATE_LIMIT_REDIS_URL: str = "redis://localhost:6379/0"
+    # memory backend 最多保留的 bucket 數
+    RATE_LIMIT_MAX_KEYS: int = 100_000
+    # 位於 proxy (ngrok 等) 之後時設為 proxy 的層數, 以 X-Forwarded-For 由右數來第 N 個作為用戶端 IP;
+    # 0 表示不信任 X-Forwarded-For
+    RATE_LIMIT_TRUSTED_PROXIES: int = 0
+
+    # 已驗證 token 的 claims 快取
+    TOKEN_CACHE_SIZE: int = 4096
+    TOKEN_CACHE_TTL: float = 60.0
+
+    # get_current_user 的使用者快取 (每個 worker 各自一份)
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL: float = 30.0
+
+    # GET /metrics 需帶 Authorization: Bearer <METRICS_TOKEN>;
+    # 未設定時只有 ENVIRONMENT=local 可以存取
+    METRICS_TOKEN: str | None = None
+
+    # app.main 冷啟動 import 時間上限 (毫秒), benchmarks/import_time.py 與 tests/test_import_time.py 使用
+    IMPORT_BUDGET_MS: float = 2500.0
+
+    # 慢查詢門檻 (毫秒), 超過時記錄 warning 並附上 EXPLAIN
+    SLOW_QUERY_MS: float = 200.0
+    # 同一個 SQL 指紋多久最多 EXPLAIN 一次 (秒)
+    SLOW_QUERY_EXPLAIN_INTERVAL: float = 60.0
+    # 最多保留的 SQL 指紋數與每個指紋用來計算 p95 的最近執行次數
+    QUERY_STATS_SIZE: int = 500
+    QUERY_STATS_WINDOW: int = 200
+
+    # GET /production 商品目錄快取秒數
+    CATALOG_CACHE_TTL: float = 60.0
+
+    # 回應壓縮 (app/core/compression.py): 最小壓縮大小 (bytes) 與壓縮等級
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 5
+    # 帶 ETag 的回應快取壓縮結果的筆數與秒數
+    COMPRESSION_CACHE_SIZE: int = 256
+    COMPRESSION_CACHE_TTL: float = 600.0
+
+    # 商品圖片目錄與縮圖設定 (app/core/images.py)
+    PRODUCTION_PICTURE_DIR: str = "/home/omni/Cert_POC/frontend/public/production_picture"
+    # 縮圖快取目錄與大小上限, 超過時刪除最久沒有使用的縮圖
+    IMAGE_CACHE_DIR: str = "/tmp/cert_poc_image_cache"
+    IMAGE_CACHE_MAX_MB: int = 512
+    # 產生縮圖的 process 數量與 WebP 品質
+    IMAGE_WORKERS: int = 2
+    IMAGE_WEBP_QUALITY: int = 80
+
+    # 購物車儲存方式 (app/core/cart_store.py)
+    # database: 每次異動直接寫資料庫; write_behind: 記憶體 + 定期批次寫回;
+    # checkout: 記憶體, 只在結帳/閒置淘汰/關機時寫回
+    # 記憶體模式只能單一 worker 使用, python -m app.serve 啟動多個 worker 時會拒絕啟動
+    CART_STORE_MODE: Literal["database", "write_behind", "checkout"] = "database"
+    # 背景寫回的間隔秒數與每個交易寫回的購物車數量
+    CART_FLUSH_INTERVAL: float = 2.0
+    CART_FLUSH_BATCH_SIZE: int = 200
+    # 閒置超過此秒數的購物車寫回後移出記憶體
+    CART_IDLE_TTL: float = 900.0
 
     # 在 pydantic 中建立新連線變數 SQLALCHEMY_DATABASE_URI
     # computed_field 不使用的話會造成 .model_dump() 被略過, 型別驗證也不會被 Pydantic 檢查
@@ -96,6 +191,25 @@ class Settings(BaseSettings):
         return self
 
     EMAIL_RESET_TOKEN_EXPIRE_HOURS: int = 48
+    # email 樣板: 開發時設為 True 會在樣板檔案修改後重新載入
+    EMAIL_TEMPLATE_RELOAD: bool = False
+    # 樣板編譯結果 (bytecode) 的快取目錄, 未設定則只快取在記憶體
+    EMAIL_TEMPLATE_CACHE_DIR: str | None = None
+
+    # 背景寄信 (app/core/email_outbox.py)
+    # 寄送方式: resend 或 fake (不寄出, 測試用)
+    EMAIL_TRANSPORT: Literal["resend", "fake"] = "resend"
+    # 同時寄送的 worker 數與每次領取的信件數
+    EMAIL_WORKERS: int = 2
+    EMAIL_BATCH_SIZE: int = 20
+    # 重試次數上限與指數退避的起始/最大等待秒數
+    EMAIL_MAX_ATTEMPTS: int = 6
+    EMAIL_RETRY_BASE: float = 5.0
+    EMAIL_RETRY_MAX: float = 900.0
+    # 領取後超過此秒數未完成, 視為中斷並重新寄送
+    EMAIL_LEASE: float = 120.0
+    # 沒有新信件時檢查 outbox 的間隔秒數
+    EMAIL_POLL_INTERVAL: float = 5.0
 
     @computed_field  # type: ignore[prop-decorator]
     @property
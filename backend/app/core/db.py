@@ -1,5 +1,132 @@
+'''
+資料庫子系統
+整個 worker 共用一個 SQLAlchemy AsyncEngine (psycopg 3), 由 app.main 的 lifespan
+在啟動時建立並預熱連線池, 關閉時釋放。SQLModel 的 route 透過 get_session 取得
+AsyncSession, 純 SQL 的 crud 透過 get_async_pg 取得 AsyncPsqlEngine, 兩者共用同一個連線池。
+'''
+
+import asyncio
+from collections.abc import AsyncIterator
+from typing import Any
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.async_pg_engine import AsyncPsqlEngine
+from app.core.config import settings
+from app.core.metrics import instrument_engine
 from app.core.pg_engine import PsqlEngine
+from app.core.pg_pool import close_pool
+
+
+class Database:
+    def __init__(self) -> None:
+        self.engine: AsyncEngine | None = None
+        # 連線池預熱完成才算 ready, GET /ready 依此回應
+        self.ready = False
+
+    def get_engine(self) -> AsyncEngine:
+        # 在 lifespan 之外 (例如 notebook、script) 使用時才在這裡建立
+        if self.engine is None:
+            self.engine = create_async_engine(
+                str(settings.SQLALCHEMY_DATABASE_URI),
+                pool_size=settings.PG_POOL_MAX_SIZE,
+                max_overflow=0,
+                pool_timeout=settings.PG_POOL_TIMEOUT,
+                pool_pre_ping=True,
+            )
+            # SQLModel session 的查詢計入每個請求的 DB 時間 (/metrics)
+            instrument_engine(self.engine)
+        return self.engine
+
+    async def warm_up(self) -> None:
+        """同時借出 PG_POOL_MIN_SIZE 條連線並執行 select 1, 歸還後留在連線池中"""
+        engine = self.get_engine()
+
+        async def _ping() -> None:
+            async with engine.connect() as conn:
+                await conn.execute(text("select 1"))
+
+        await asyncio.gather(*(_ping() for _ in range(settings.PG_POOL_MIN_SIZE)))
+
+    async def startup(self) -> None:
+        if settings.DB_INIT_ON_STARTUP:
+            await init_db(self.get_engine())
+        await self.warm_up()
+        self.ready = True
+        logger.info(f"Database pool ready: {self.stats()}")
+
+    async def shutdown(self) -> None:
+        self.ready = False
+        if self.engine is not None:
+            await self.engine.dispose()
+            self.engine = None
+        # 若有 script 使用過 psycopg2 的 PsqlEngine 一併關閉
+        close_pool()
+
+    def stats(self) -> dict[str, Any]:
+        if self.engine is None:
+            return {"started": False}
+        pool = self.engine.pool
+        return {
+            "started": True,
+            "ready": self.ready,
+            "pool_size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        }
+
+
+db = Database()
+
+
+def _create_indexes(conn: Any) -> None:
+    # create_all 不會替已存在的資料表補索引, 這裡逐一補上;
+    # 標記 migration 的索引 (例如需要先整理資料的 unique index) 只檢查並提示執行 migration
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            migration = index.info.get("migration")
+            if migration is None:
+                index.create(conn, checkfirst=True)
+            elif not _index_exists(conn, table.schema, index.name):
+                logger.error(
+                    f"Index {index.name} is missing, run: python -m {migration}"
+                )
+
+
+def _index_exists(conn: Any, schema: str | None, name: str | None) -> bool:
+    return (
+        conn.execute(
+            text(
+                "select 1 from pg_indexes where schemaname = :schema and indexname = :name"
+            ),
+            {"schema": schema or "public", "name": name},
+        ).first()
+        is not None
+    )
+
+
+async def init_db(engine: AsyncEngine) -> None:
+    # 建立尚未存在的資料表 (orders / order_items) 與索引
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.run_sync(_create_indexes)
+
+
+async def get_session() -> AsyncIterator[AsyncSession]:
+    async with AsyncSession(db.get_engine(), expire_on_commit=False) as session:
+        yield session
+
 
 def get_pg():
     pg = PsqlEngine()
-    return pg
\ No newline at end of file
+    return pg
+
+
+def get_async_pg():
+    pg = AsyncPsqlEngine(db.get_engine())
+    return pg
@@ -0,0 +1,286 @@
+'''
+背景寄信
+route 只把信件寫入 app.email_outbox 後立即回應, 由 lifespan 啟動的 worker 批次寄出:
+  - EMAIL_WORKERS 個 worker 同時寄送 (併發上限), 每次領取 EMAIL_BATCH_SIZE 封
+  - 領取時以 FOR UPDATE SKIP LOCKED 鎖定, 多個 process 同時執行也不會重複寄送
+  - 寄送失敗以指數退避 (EMAIL_RETRY_BASE * 2^n, 上限 EMAIL_RETRY_MAX) 重試,
+    超過 EMAIL_MAX_ATTEMPTS 次標記為 failed
+  - 領取後 EMAIL_LEASE 秒內沒有回報結果 (例如 process 異常結束) 的信件會被重新領取
+  - 信件內容可能含有啟用或重設密碼的連結 (token), 標記為 sent / failed 時清空 html_content,
+    資料表只保留寄送紀錄
+寄送方式由 EMAIL_TRANSPORT 選擇: resend 或 fake (只記錄在記憶體, 測試用)。
+'''
+
+import asyncio
+import random
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any
+
+from fastapi.concurrency import run_in_threadpool
+from loguru import logger
+
+from app.core.async_pg_engine import AsyncPsqlEngine
+from app.core.config import settings
+from app.core.db import get_async_pg
+
+
+@dataclass
+class OutboxMessage:
+    id: int
+    email_to: str
+    subject: str
+    html_content: str
+    attempts: int
+
+
+class EmailTransport(ABC):
+    @abstractmethod
+    async def send_batch(self, messages: list[OutboxMessage]) -> list[str | None]:
+        """回傳與 messages 同順序的結果, None 代表寄送成功, 否則為錯誤訊息"""
+
+
+class ResendTransport(EmailTransport):
+    """以 resend 的 batch API 一次送出多封: https://resend.com/docs/api-reference/emails/send-batch-emails"""
+
+    def _send(self, messages: list[OutboxMessage]) -> Any:
+        import resend
+
+        resend.api_key = settings.EMAIL_API_KEY
+        return resend.Batch.send(
+            [
+                {
+                    "from": settings.EMAILS_FROM_EMAIL,
+                    "to": message.email_to,
+                    "subject": message.subject,
+                    "html": message.html_content,
+                }
+                for message in messages
+            ]
+        )
+
+    async def send_batch(self, messages: list[OutboxMessage]) -> list[str | None]:
+        if not settings.emails_enabled:
+            return ["no provided configuration for email variables"] * len(messages)
+        try:
+            response = await run_in_threadpool(self._send, messages)
+        except Exception as e:
+            # batch API 整批成功或整批失敗
+            return [str(e)] * len(messages)
+        logger.info(f"send email result: {response}")
+        return [None] * len(messages)
+
+
+class FakeTransport(EmailTransport):
+    """
+    不實際寄信, 寄出的信件記錄在 sent。
+    fail_times 大於 0 時, 前 fail_times 次寄送會失敗, 用來測試重試。
+    """
+
+    def __init__(self, fail_times: int = 0) -> None:
+        self.sent: list[OutboxMessage] = []
+        self.fail_times = fail_times
+
+    async def send_batch(self, messages: list[OutboxMessage]) -> list[str | None]:
+        results: list[str | None] = []
+        for message in messages:
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                results.append("fake transport failure")
+            else:
+                self.sent.append(message)
+                results.append(None)
+        return results
+
+
+def create_transport() -> EmailTransport:
+    if settings.EMAIL_TRANSPORT == "fake":
+        return FakeTransport()
+    return ResendTransport()
+
+
+CLAIM_DUE = """
+    update app.email_outbox
+    set status = 'sending', attempts = attempts + 1, next_attempt_at = %s
+    where id in (
+        select id from app.email_outbox
+        where status in ('pending', 'sending') and next_attempt_at <= %s
+        order by next_attempt_at
+        limit %s
+        for update skip locked
+    )
+    returning id, email_to, subject, html_content, attempts
+"""
+
+
+class EmailOutbox:
+    def __init__(
+        self,
+        transport: EmailTransport,
+        *,
+        workers: int,
+        batch_size: int,
+        max_attempts: int,
+        retry_base: float,
+        retry_max: float,
+        lease: float,
+        poll_interval: float,
+    ) -> None:
+        self.transport = transport
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._wake = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._stats = {"enqueued": 0, "sent": 0, "retried": 0, "failed": 0}
+
+    async def enqueue(
+        self,
+        *,
+        email_to: str,
+        subject: str,
+        html_content: str,
+        pg: AsyncPsqlEngine | None = None,
+    ) -> int:
+        """寫入 outbox 並喚醒 worker, 不等待寄送結果"""
+        pg = pg or get_async_pg()
+        row = await pg.execute_query(
+            """
+            insert into app.email_outbox
+                (email_to, subject, html_content, status, attempts,
+                 next_attempt_at, created_date)
+            values (%s, %s, %s, 'pending', 0, %s, %s)
+            returning id
+            """,
+            first=True,
+            params=(email_to, subject, html_content, datetime.now(), datetime.now()),
+        )
+        self._stats["enqueued"] += 1
+        self._wake.set()
+        return row.id
+
+    def backoff(self, attempts: int) -> float:
+        """第 attempts 次失敗後的等待秒數, 加上隨機抖動避免同時重試"""
+        delay = min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _claim(self, pg: AsyncPsqlEngine) -> list[OutboxMessage]:
+        now = datetime.now()
+        rows = await pg.execute_query(
+            CLAIM_DUE,
+            params=(now + timedelta(seconds=self.lease), now, self.batch_size),
+        )
+        return [OutboxMessage(*row) for row in rows]
+
+    async def _finish(
+        self, pg: AsyncPsqlEngine, messages: list[OutboxMessage], errors: list[str | None]
+    ) -> None:
+        now = datetime.now()
+        sent, retry, failed = [], [], []
+        for message, error in zip(messages, errors):
+            if error is None:
+                sent.append((now, message.id))
+            elif message.attempts >= self.max_attempts:
+                failed.append((error, message.id))
+                logger.error(f"Email {message.id} to {message.email_to} failed: {error}")
+            else:
+                next_at = now + timedelta(seconds=self.backoff(message.attempts))
+                retry.append((next_at, error, message.id))
+        async with pg.connection() as conn:
+            async with conn.cursor() as cursor:
+                if sent:
+                    await cursor.executemany(
+                        """
+                        update app.email_outbox
+                        set status = 'sent', sent_date = %s, last_error = null,
+                            html_content = ''
+                        where id = %s
+                        """,
+                        sent,
+                    )
+                if retry:
+                    await cursor.executemany(
+                        """
+                        update app.email_outbox
+                        set status = 'pending', next_attempt_at = %s, last_error = %s
+                        where id = %s
+                        """,
+                        retry,
+                    )
+                if failed:
+                    await cursor.executemany(
+                        """
+                        update app.email_outbox
+                        set status = 'failed', last_error = %s, html_content = ''
+                        where id = %s
+                        """,
+                        failed,
+                    )
+        self._stats["sent"] += len(sent)
+        self._stats["retried"] += len(retry)
+        self._stats["failed"] += len(failed)
+
+    async def process_once(self, pg: AsyncPsqlEngine | None = None) -> int:
+        """領取一批到期的信件並寄出, 回傳處理的數量"""
+        pg = pg or get_async_pg()
+        messages = await self._claim(pg)
+        if not messages:
+            return 0
+        try:
+            errors = await self.transport.send_batch(messages)
+        except Exception as e:
+            errors = [str(e)] * len(messages)
+        await self._finish(pg, messages, errors)
+        return len(messages)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if await self.process_once():
+                    continue
+            except Exception as e:
+                logger.error(f"Email outbox worker error: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._run()) for _ in range(self.workers)
+            ]
+            logger.info(f"Email outbox started with {self.workers} workers")
+
+    async def close(self) -> None:
+        # 寄送中的信件在 lease 到期後由下一次啟動的 worker 重新領取
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "running": len(self._tasks),
+            "transport": type(self.transport).__name__,
+            **self._stats,
+        }
+
+
+email_outbox = EmailOutbox(
+    create_transport(),
+    workers=settings.EMAIL_WORKERS,
+    batch_size=settings.EMAIL_BATCH_SIZE,
+    max_attempts=settings.EMAIL_MAX_ATTEMPTS,
+    retry_base=settings.EMAIL_RETRY_BASE,
+    retry_max=settings.EMAIL_RETRY_MAX,
+    lease=settings.EMAIL_LEASE,
+    poll_interval=settings.EMAIL_POLL_INTERVAL,
+)
@@ -0,0 +1,61 @@
+'''
+email 樣板
+整個 process 共用一個 jinja2 Environment, 樣板只在第一次使用 (或啟動時 precompile) 讀檔並編譯,
+之後直接從記憶體快取取用, 大量寄信時不再每封都讀檔與重新編譯。
+  - EMAIL_TEMPLATE_RELOAD=True: 開發模式, 每次取用時檢查檔案修改時間, 有變更就重新載入
+  - EMAIL_TEMPLATE_CACHE_DIR: 編譯結果 (bytecode) 存放的目錄, 新 process 啟動時不必重新編譯
+'''
+
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from loguru import logger
+
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    from jinja2 import Environment, Template
+
+TEMPLATE_DIR = Path(__file__).parent.parent / "email-templates"
+
+_env: "Environment | None" = None
+
+
+def get_template_env() -> "Environment":
+    global _env
+    if _env is None:
+        # jinja2 在 lifespan precompile 或第一次寄信時才載入
+        from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+        bytecode_cache = None
+        if settings.EMAIL_TEMPLATE_CACHE_DIR:
+            cache_dir = Path(settings.EMAIL_TEMPLATE_CACHE_DIR)
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(str(cache_dir))
+        _env = Environment(
+            loader=FileSystemLoader(TEMPLATE_DIR),
+            # cache_size=-1: 已編譯的樣板全部保留, 不做 LRU 淘汰
+            cache_size=-1,
+            auto_reload=settings.EMAIL_TEMPLATE_RELOAD,
+            bytecode_cache=bytecode_cache,
+            autoescape=False,
+        )
+    return _env
+
+
+def get_template(template_name: str) -> "Template":
+    return get_template_env().get_template(template_name)
+
+
+def render_template(template_name: str, context: dict[str, Any]) -> str:
+    return get_template(template_name).render(context)
+
+
+def precompile_templates() -> list[str]:
+    """啟動時編譯 email-templates 內的所有樣板, 回傳已載入的樣板名稱"""
+    env = get_template_env()
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    logger.info(f"Email templates compiled: {names}")
+    return names
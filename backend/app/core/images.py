@@ -0,0 +1,253 @@
+'''
+商品圖片服務
+PRODUCTION_PICTURE_DIR 內的圖片改由 GET {API_V1_STR}/images/{variant}/{digest}/{filename} 提供:
+  - digest 為檔案內容的 sha256 前 16 碼, 檔案內容改變時網址也跟著改變,
+    因此回應可以設定一年的 Cache-Control immutable, 瀏覽器與 CDN 不需要再驗證
+  - 支援 If-None-Match, ETag 相同時回 304
+  - variant: thumbnail / card / detail 為縮圖後的 WebP, original 為原檔。
+    縮圖在第一次請求時由獨立的 process pool (Pillow) 產生, 存放在 IMAGE_CACHE_DIR,
+    總大小超過 IMAGE_CACHE_MAX_MB 時刪除最久沒有使用的檔案。
+    多個 worker 共用同一個快取目錄, 各自的索引只記得自己看過的檔案, 因此每 CACHE_SCAN_INTERVAL 秒
+    (或本 worker 的索引已超過上限時) 重新掃描目錄, 以整個目錄的大小執行上限;
+    最近使用時間以檔案 mtime 表示, 命中時最多每 TOUCH_INTERVAL 秒更新一次
+商品目錄回應中的 picture_url 由 url_for 換成對應 variant 的網址。
+未安裝 Pillow 時所有 variant 都回傳原檔。
+'''
+
+import asyncio
+import hashlib
+import importlib.util
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+from app.core.config import settings
+
+# 每個 variant 縮圖後的最大寬高 (等比例縮放, 不放大)
+VARIANTS: dict[str, tuple[int, int]] = {
+    "thumbnail": (160, 160),
+    "card": (480, 360),
+    "detail": (1200, 900),
+}
+ORIGINAL = "original"
+IMMUTABLE = "public, max-age=31536000, immutable"
+# 重新掃描快取目錄的間隔 (秒) 與命中時更新 mtime 的間隔 (秒)
+CACHE_SCAN_INTERVAL = 30.0
+TOUCH_INTERVAL = 3600.0
+
+
+def resize_image(source: str, target: str, size: tuple[int, int], quality: int) -> int:
+    """在 process pool 中執行: 縮圖並存成 WebP, 回傳檔案大小"""
+    from PIL import Image
+
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with Image.open(source) as image:
+        image.thumbnail(size)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        image.save(tmp, format="WEBP", quality=quality, method=4)
+    # 先寫暫存檔再改名, 其他 worker 不會讀到寫到一半的檔案
+    os.replace(tmp, target)
+    return os.path.getsize(target)
+
+
+class ImageStore:
+    def __init__(
+        self,
+        directory: Path,
+        cache_dir: Path,
+        max_cache_bytes: int,
+        workers: int,
+        quality: int,
+    ) -> None:
+        self.directory = directory
+        self.cache_dir = cache_dir
+        self.max_cache_bytes = max_cache_bytes
+        self.workers = workers
+        self.quality = quality
+        self.can_resize = importlib.util.find_spec("PIL") is not None
+        self._executor: ProcessPoolExecutor | None = None
+        # filename -> (mtime_ns, size, digest)
+        self._digests: dict[str, tuple[int, int, str]] = {}
+        # 縮圖快取: path -> size, 依最近使用排序
+        self._cache: OrderedDict[str, int] = OrderedDict()
+        self._cache_bytes = 0
+        self._last_scan = 0.0
+        # 同一個縮圖只產生一次, 其他請求等待同一個 future
+        self._pending: dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {"generated": 0, "evicted": 0, "hits": 0}
+
+    def start(self) -> None:
+        if not self.can_resize:
+            logger.warning("Pillow is not installed, image variants serve originals")
+            return
+        if self._executor is None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._scan_cache()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _scan_cache(self) -> None:
+        """
+        以目錄中的所有縮圖 (包含其他 worker 產生的) 重建索引, 依 mtime 排序,
+        超過上限時刪除最舊的檔案。會讀取整個目錄, 在 event loop 中需以 thread 執行
+        """
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".webp"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, entry.path, stat.st_size))
+        files.sort()
+        with self._lock:
+            self._cache = OrderedDict((path, size) for _, path, size in files)
+            self._cache_bytes = sum(size for _, _, size in files)
+            self._last_scan = time.monotonic()
+        self._evict()
+
+    def _needs_scan(self) -> bool:
+        return (
+            time.monotonic() - self._last_scan >= CACHE_SCAN_INTERVAL
+            or self._cache_bytes > self.max_cache_bytes
+        )
+
+    def source_path(self, filename: str) -> Path | None:
+        # 只接受目錄內的檔名, 不允許 ../ 等路徑
+        if not filename or Path(filename).name != filename:
+            return None
+        path = self.directory / filename
+        return path if path.is_file() else None
+
+    def digest(self, path: Path) -> str:
+        """檔案內容的 hash, 以 mtime 與大小判斷是否需要重新計算"""
+        stat = path.stat()
+        cached = self._digests.get(path.name)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                h.update(chunk)
+        digest = h.hexdigest()[:16]
+        self._digests[path.name] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def url_for(self, picture_url: str | None, variant: str) -> str | None:
+        """
+        把資料庫中的 picture_url (原本 StaticFiles 的路徑) 換成帶 hash 的 variant 網址,
+        找不到檔案時維持原值
+        """
+        if not picture_url:
+            return picture_url
+        path = self.source_path(Path(picture_url).name)
+        if path is None:
+            return picture_url
+        return f"{settings.API_V1_STR}/images/{variant}/{self.digest(path)}/{path.name}"
+
+    def etag(self, digest: str, variant: str) -> str:
+        return f'"{digest}-{variant}"'
+
+    async def variant_path(self, source: Path, digest: str, variant: str) -> Path:
+        """回傳 variant 的檔案路徑, 尚未產生時交給 process pool 產生"""
+        if variant == ORIGINAL or not self.can_resize:
+            return source
+        self.start()
+        target = str(self.cache_dir / f"{digest}-{variant}.webp")
+        with self._lock:
+            if target in self._cache:
+                self._cache.move_to_end(target)
+                self._stats["hits"] += 1
+                hit = True
+            else:
+                hit = False
+        # 多個 worker 共用快取目錄, 檔案可能已被其他 worker 產生或淘汰
+        try:
+            stat = os.stat(target)
+        except FileNotFoundError:
+            stat = None
+        if stat is not None:
+            if time.time() - stat.st_mtime >= TOUCH_INTERVAL:
+                # 讓其他 worker 掃描目錄時知道這個檔案最近還有人使用
+                os.utime(target)
+            if not hit:
+                self._add_to_cache(target, stat.st_size, generated=False)
+            return Path(target)
+        future = self._pending.get(target)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(
+                self._executor,
+                resize_image,
+                str(source),
+                target,
+                VARIANTS[variant],
+                self.quality,
+            )
+            self._pending[target] = future
+            try:
+                size = await future
+            finally:
+                self._pending.pop(target, None)
+            self._add_to_cache(target, size)
+            if self._needs_scan():
+                await asyncio.to_thread(self._scan_cache)
+        else:
+            await future
+        return Path(target)
+
+    def _add_to_cache(self, target: str, size: int, generated: bool = True) -> None:
+        with self._lock:
+            self._stats["generated"] += generated
+            self._cache_bytes += size - self._cache.pop(target, 0)
+            self._cache[target] = size
+        self._evict()
+
+    def _evict(self) -> None:
+        evict: list[str] = []
+        with self._lock:
+            while self._cache_bytes > self.max_cache_bytes and len(self._cache) > 1:
+                path, old_size = self._cache.popitem(last=False)
+                self._cache_bytes -= old_size
+                evict.append(path)
+            self._stats["evicted"] += len(evict)
+        for path in evict:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "can_resize": self.can_resize,
+            "cached_files": len(self._cache),
+            "cache_bytes": self._cache_bytes,
+            "max_cache_bytes": self.max_cache_bytes,
+            **self._stats,
+        }
+
+
+image_store = ImageStore(
+    directory=Path(settings.PRODUCTION_PICTURE_DIR),
+    cache_dir=Path(settings.IMAGE_CACHE_DIR),
+    max_cache_bytes=settings.IMAGE_CACHE_MAX_MB * 1024 * 1024,
+    workers=settings.IMAGE_WORKERS,
+    quality=settings.IMAGE_WEBP_QUALITY,
+)
@@ -0,0 +1,304 @@
+'''
+Prometheus 格式的監控指標
+  - MetricsMiddleware: 每個 route 的延遲 histogram、狀態碼計數與處理中的請求數
+  - 每個請求的 DB 時間與查詢次數: AsyncPsqlEngine / PsqlEngine 以 query_timer 計時,
+    SQLAlchemy 的 engine 由 instrument_engine 掛上 cursor execute 事件
+  - 每個請求花在 bcrypt process pool 的時間 (password_pool)
+  - 每次查詢同時交給 query_stats 依 SQL 指紋彙總與記錄慢查詢
+route 總時間扣掉 DB 與 bcrypt 時間, 剩下的就是 Python 端處理與序列化的時間。
+由 app.main 的 GET /metrics 輸出。指標存在各 worker 的記憶體中, 多 worker 時 Prometheus
+需要分別抓取每個 worker, 或在前面加一層彙整。
+'''
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Iterator
+
+from app.core.query_stats import query_stats
+
+# 延遲 (秒) 的 histogram 區間
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0,
+)
+# 每個請求的查詢次數區間
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        # labels -> [各區間的次數..., 總和, 次數]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(labels)
+            if data is None:
+                data = self._values[labels] = [0.0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                data[index] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        names = self.labels + ("le",)
+        with self._lock:
+            for labels, data in sorted(self._values.items()):
+                cumulative = 0.0
+                for bound, count in zip(self.buckets, data):
+                    cumulative += count
+                    lines.append(
+                        f"{self.name}_bucket{_format_labels(names, labels + (str(bound),))} {cumulative}"
+                    )
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(names, labels + ('+Inf',))} {data[-1]}"
+                )
+                label_str = _format_labels(self.labels, labels)
+                lines.append(f"{self.name}_sum{label_str} {data[-2]}")
+                lines.append(f"{self.name}_count{label_str} {data[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Any:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self, extra: list[str] | None = None) -> str:
+        lines: list[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        lines.extend(extra or [])
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(
+    Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+)
+http_latency = registry.register(
+    Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+)
+http_in_progress = registry.register(
+    Gauge("http_requests_in_progress", "HTTP requests currently being served", ("method",))
+)
+request_db_time = registry.register(
+    Histogram("http_request_db_seconds", "DB time spent per request", ("method", "route"))
+)
+request_db_queries = registry.register(
+    Histogram(
+        "http_request_db_queries",
+        "DB queries executed per request",
+        ("method", "route"),
+        buckets=COUNT_BUCKETS,
+    )
+)
+request_hash_time = registry.register(
+    Histogram(
+        "http_request_password_hash_seconds",
+        "bcrypt time spent per request",
+        ("method", "route"),
+    )
+)
+db_queries = registry.register(
+    Histogram("db_query_duration_seconds", "DB query latency by engine", ("engine",))
+)
+
+
+@dataclass
+class RequestMetrics:
+    db_time: float = 0.0
+    db_queries: int = 0
+    hash_time: float = 0.0
+
+
+# 目前請求的累計值, 由 MetricsMiddleware 設定; 請求之外 (script, 背景工作) 為 None
+current_request: ContextVar[RequestMetrics | None] = ContextVar(
+    "current_request", default=None
+)
+
+
+def observe_query(engine: str, elapsed: float) -> None:
+    db_queries.observe(elapsed, engine)
+    request = current_request.get()
+    if request is not None:
+        request.db_time += elapsed
+        request.db_queries += 1
+
+
+@dataclass
+class QueryTiming:
+    elapsed: float = 0.0
+    # 慢查詢且需要附上 EXPLAIN (見 app/core/query_stats.py)
+    explain: bool = False
+
+
+@contextmanager
+def query_timer(engine: str, stmt: str) -> Iterator[QueryTiming]:
+    timing = QueryTiming()
+    start = time.perf_counter()
+    try:
+        yield timing
+    finally:
+        timing.elapsed = time.perf_counter() - start
+        observe_query(engine, timing.elapsed)
+        timing.explain = query_stats.record(stmt, timing.elapsed)
+
+
+def observe_password_hash(elapsed: float) -> None:
+    request = current_request.get()
+    if request is not None:
+        request.hash_time += elapsed
+
+
+def instrument_engine(engine: Any) -> None:
+    """SQLAlchemy (Async)Engine 的每次 cursor execute 計入 DB 時間"""
+    from sqlalchemy import event
+
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_start"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop("query_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        observe_query("sqlalchemy", elapsed)
+        if query_stats.record(statement, elapsed) and not executemany:
+            # 在背景以另一條連線 EXPLAIN, 不拖慢目前的請求
+            from app.core.db import get_async_pg
+
+            get_async_pg().explain_later(statement, parameters, elapsed)
+
+
+def route_label(scope: dict[str, Any]) -> str:
+    # 使用 route 的路徑樣板 (例如 /api/cart/{customer_id}), 避免每個 id 都成為一組新的 label
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path:
+        return path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware, 不經過 BaseHTTPMiddleware 以免影響 StreamingResponse"""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        status = 500
+        request = RequestMetrics()
+        token = current_request.set(request)
+
+        async def send_wrapper(message: dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_progress.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_in_progress.dec(method)
+            current_request.reset(token)
+            route = route_label(scope)
+            http_requests.inc(method, route, str(status))
+            http_latency.observe(elapsed, method, route)
+            request_db_time.observe(request.db_time, method, route)
+            request_db_queries.observe(request.db_queries, method, route)
+            if request.hash_time:
+                request_hash_time.observe(request.hash_time, method, route)
+
+
+def render_gauges(name: str, help: str, values: dict[str, Any]) -> list[str]:
+    """把各子系統 stats() 的數值欄位輸出成 gauge, 例如 db.stats()"""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+    for key, value in values.items():
+        if isinstance(value, bool | int | float):
+            lines.append(f'{name}{{key="{key}"}} {float(value)}')
+    return lines
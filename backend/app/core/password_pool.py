@@ -0,0 +1,101 @@
+'''
+bcrypt 專用的 process pool
+bcrypt 每次 hash/verify 約 100~300ms CPU 且會持有 GIL, 放在 request 中執行時
+一波登入就會拖慢同一個 worker 上的所有 route。這裡改由獨立的 process pool 計算,
+並限制排隊中的工作數量, 超過上限直接拒絕 (503), 而不是讓延遲無限制地上升。
+子 process 異常結束 (例如被 OOM killer 終止) 時整個 pool 會失效, 這時重新建立 pool 並重試一次。
+'''
+
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+from loguru import logger
+
+from app.core import security
+from app.core.config import settings
+from app.core.metrics import observe_password_hash
+
+
+class PasswordHasherBusy(Exception):
+    """排隊中的 hash/verify 已達上限"""
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_pending: int) -> None:
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: ProcessPoolExecutor | None = None
+        self._pending = 0
+        self._rejected = 0
+        self._restarts = 0
+
+    def start(self) -> None:
+        if self._executor is None:
+            # spawn: 不複製 parent 的 thread / 連線狀態
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            logger.info(f"Password hasher started with {self.workers} processes")
+
+    async def shutdown(self) -> None:
+        # 等待子 process 結束會阻塞, 不在 event loop 中執行
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        # 同時失敗的多個請求只重建一次
+        if self._executor is not broken:
+            return
+        logger.error("Password hasher process pool is broken, restarting it")
+        broken.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._restarts += 1
+        self.start()
+
+    async def _submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self._pending >= self.max_pending:
+            self._rejected += 1
+            raise PasswordHasherBusy()
+        self.start()
+        self._pending += 1
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            executor = self._executor
+            try:
+                return await loop.run_in_executor(executor, fn, *args)
+            except BrokenProcessPool:
+                self._restart(executor)
+                return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+            observe_password_hash(time.perf_counter() - start)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit(
+            security.verify_password, plain_password, hashed_password
+        )
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(security.get_password_hash, password)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "rejected": self._rejected,
+            "restarts": self._restarts,
+        }
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
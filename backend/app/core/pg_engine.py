@@ -1,4 +1,11 @@
-from typing import Annotated, Any
+import io
+import itertools
+import json
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time
+from typing import Annotated, Any, Iterable, Iterator, Sequence
 
 import psycopg2
 import psycopg2.extras
@@ -6,6 +13,9 @@ from loguru import logger
 from pydantic import BaseModel, Field
 
 from .config import settings
+from .metrics import query_timer
+from .query_stats import log_slow_query
+from .pg_pool import get_pool
 
 POSTGRES_DB: str = settings.POSTGRES_DB
 POSTGRES_USER: str = settings.POSTGRES_USER
@@ -14,6 +24,100 @@ POSTGRES_SERVER: str = settings.POSTGRES_SERVER
 POSTGRES_PORT: int = settings.POSTGRES_PORT
 CONNECTION = None
 CURSOR = None
+# 每條連線最多保留的 prepared statement 數量, 超過時釋放最久沒用的
+PREPARED_MAX = 100
+
+# server-side cursor 每次向 server 取回的筆數
+ITERSIZE = 2000
+# COPY 每次送出的資料量 (bytes) 與 execute_values 每批的筆數
+COPY_BUFFER_SIZE = 1 << 16
+INSERT_PAGE_SIZE = 1000
+
+_PLACEHOLDER = re.compile(r"%%|%s")
+
+# 慢查詢的 EXPLAIN 在背景 thread 執行, 不佔用發出查詢的 request thread
+_explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pg-explain")
+
+
+def to_server_placeholders(stmt: str) -> str:
+    """把 psycopg2 的 %s 轉為 PREPARE 使用的 $1, $2 ..."""
+    counter = 0
+
+    def _replace(match: re.Match) -> str:
+        nonlocal counter
+        if match.group() == "%%":
+            return "%"
+        counter += 1
+        return f"${counter}"
+
+    return _PLACEHOLDER.sub(_replace, stmt).rstrip().rstrip(";")
+
+
+def _copy_array(values: Sequence[Any]) -> str:
+    items = []
+    for value in values:
+        if value is None:
+            items.append("NULL")
+        else:
+            text = _copy_value(value)
+            items.append('"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"')
+    return "{" + ",".join(items) + "}"
+
+
+def _copy_value(value: Any) -> str:
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (list, tuple)):
+        return _copy_array(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def to_copy_line(row: Sequence[Any]) -> str:
+    """把一筆資料轉為 COPY text format 的一行"""
+    fields = []
+    for value in row:
+        if value is None:
+            fields.append("\\N")
+            continue
+        fields.append(
+            _copy_value(value)
+            .replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+        )
+    return "\t".join(fields) + "\n"
+
+
+class CopyStream(io.RawIOBase):
+    """
+    給 copy_expert 讀取的串流, 每次只把需要的資料列轉成文字,
+    記憶體用量與總筆數無關
+    """
+
+    def __init__(self, rows: Iterable[Sequence[Any]]) -> None:
+        self._lines: Iterator[str] = map(to_copy_line, rows)
+        self._buffer = b""
+        self.rows = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = COPY_BUFFER_SIZE
+        while len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line.encode("utf-8")
+            self.rows += 1
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
 
 
 class PsqlEngine(BaseModel):
@@ -25,37 +129,103 @@ class PsqlEngine(BaseModel):
     conn: Annotated[int, Field(default=CONNECTION)]
     cursor: Annotated[int, Field(default=CURSOR)]
 
-    def model_post_init(self, context: Any):
-        self.connect_db()
-
     def connect_db(self):
-        self.conn = psycopg2.connect(
-            dbname=self.dbname,
-            user=self.user,
-            password=self.password,
-            host=self.host,
-            port=self.port,
-        )
-        self.conn.set_session(autocommit=False)
+        # 從 process 共用的連線池借出連線, close_connect() 時歸還
+        if not self.conn:
+            self.conn = get_pool().getconn()
         return self
 
     def re_connect(self):
         self.connect_db()
 
+    def _execute(
+        self, stmt: str, params: Sequence[Any] | None, prepare: bool
+    ) -> None:
+        """
+        prepare=True 時以 server 端 prepared statement 執行,
+        同一條連線上相同的 SQL 文字只會 PREPARE 一次, 之後都是 EXECUTE
+        """
+        with query_timer("psycopg2", stmt) as timing:
+            self._execute_stmt(stmt, params, prepare)
+        if timing.explain:
+            params = tuple(params) if params is not None else None
+            _explain_executor.submit(self._explain, stmt, params, timing.elapsed)
+
+    @staticmethod
+    def _explain(stmt: str, params: Sequence[Any] | None, elapsed: float) -> None:
+        """
+        在背景 thread 以另一條連線 EXPLAIN, 連同執行計畫一起記錄;
+        連線池沒有空閒連線時不等待, 只記錄慢查詢, 避免在連線吃緊時再搶一條連線
+        """
+        pool = get_pool()
+        conn = None
+        try:
+            conn = pool.getconn(wait=False)
+            if conn is None:
+                log_slow_query(stmt, elapsed, ["EXPLAIN skipped: no idle connection"])
+                return
+            with conn.cursor() as cursor:
+                cursor.execute(f"explain {stmt}", params)
+                plan = [row[0] for row in cursor.fetchall()]
+            conn.rollback()
+        except Exception as e:
+            plan = [f"EXPLAIN failed: {e}"]
+        finally:
+            pool.putconn(conn)
+        log_slow_query(stmt, elapsed, plan)
+
+    def _execute_stmt(
+        self, stmt: str, params: Sequence[Any] | None, prepare: bool
+    ) -> None:
+        prepared = getattr(self.conn, "prepared", None)
+        if not prepare or prepared is None:
+            self.cursor.execute(stmt, params)
+            return
+        name = prepared.get(stmt)
+        if name is None:
+            self.conn.prepared_seq += 1
+            name = f"pg_engine_{self.conn.prepared_seq}"
+            self.cursor.execute(f"prepare {name} as {to_server_placeholders(stmt)}")
+            prepared[stmt] = name
+            if len(prepared) > PREPARED_MAX:
+                _, old_name = prepared.popitem(last=False)
+                self.cursor.execute(f"deallocate {old_name}")
+        else:
+            prepared.move_to_end(stmt)
+        if params:
+            placeholders = ",".join(["%s"] * len(params))
+            self.cursor.execute(f"execute {name} ({placeholders})", params)
+        else:
+            self.cursor.execute(f"execute {name}")
+
+    def _rollback(self) -> None:
+        self.conn.rollback()
+        prepared = getattr(self.conn, "prepared", None)
+        if prepared:
+            # 交易失敗後無法確定哪些 prepared statement 還存在, 全部釋放重來
+            prepared.clear()
+            with self.conn.cursor() as cursor:
+                cursor.execute("deallocate all")
+            self.conn.commit()
+
     def execute_cmd(
-        self, stmt: str, cursor_factory=psycopg2.extras.NamedTupleCursor
+        self,
+        stmt: str,
+        cursor_factory=psycopg2.extras.NamedTupleCursor,
+        params: Sequence[Any] | None = None,
+        prepare: bool = False,
     ) -> None:
+        if not self.conn:
+            self.re_connect()
         try:
-            if not self.conn:
-                self.re_connect()
             if not self.cursor:
                 self.cursor = self.conn.cursor(cursor_factory=cursor_factory)
-            self.cursor.execute(stmt)
+            self._execute(stmt, params, prepare)
             self.conn.commit()
         except Exception as e:
             logger.error(e)
             logger.error(f"Error sql statement: {stmt}")
-            self.conn.rollback()
+            self._rollback()
         finally:
             self.close_connect()
 
@@ -64,50 +234,109 @@ class PsqlEngine(BaseModel):
         stmt: str,
         cursor_factory=psycopg2.extras.NamedTupleCursor,
         first: bool = False,
+        params: Sequence[Any] | None = None,
+        prepare: bool = False,
     ) -> list[Any]:
+        """
+        params: 對應 stmt 中 %s 的參數, 不要再用 f-string 把值拼進 SQL
+        prepare: 熱門查詢設為 True, 以 prepared statement 重複使用查詢計畫
+        """
+        if not self.conn:
+            self.re_connect()
         try:
-            if not self.conn:
-                self.re_connect()
             if not self.cursor:
                 self.cursor = self.conn.cursor(cursor_factory=cursor_factory)
-            self.cursor.execute(stmt)
+            self._execute(stmt, params, prepare)
             result = self.cursor.fetchall()
             self.conn.commit()
         except Exception as e:
             logger.error(e)
             logger.error(f"Error sql statement: {stmt}")
-            self.conn.rollback()
+            self._rollback()
         finally:
             self.close_connect()
         return result[0] if first and result else result
 
-    def insert_mogrify(self, table_name: str, values: list[tuple[Any, ...]]) -> None:
+    def iter_query(
+        self,
+        stmt: str,
+        params: Sequence[Any] | None = None,
+        itersize: int = ITERSIZE,
+        cursor_factory=psycopg2.extras.NamedTupleCursor,
+    ) -> Iterator[Any]:
+        """
+        以 named (server-side) cursor 逐筆讀取查詢結果, 每次只向 server 取回 itersize 筆,
+        大量資料 (匯出、歷史訂單) 不會一次全部載入記憶體。
+        迭代期間會一直佔用一條連線, 迭代結束或中途 close() 時歸還。
+        """
+        if not self.conn:
+            self.re_connect()
+        cursor = self.conn.cursor(
+            name=f"pg_engine_iter_{uuid.uuid4().hex}", cursor_factory=cursor_factory
+        )
+        cursor.itersize = itersize
+        try:
+            with query_timer("psycopg2", stmt):
+                cursor.execute(stmt, params)
+            yield from cursor
+            cursor.close()
+            self.conn.commit()
+        except BaseException as e:
+            if isinstance(e, Exception):
+                logger.error(e)
+                logger.error(f"Error sql statement: {stmt}")
+            self._rollback()
+            raise
+        finally:
+            self.close_connect()
+
+    def insert_mogrify(
+        self,
+        table_name: str,
+        values: Iterable[tuple[Any, ...]],
+        on_conflict: str | None = None,
+    ) -> None:
+        """
+        大量寫入資料。
+        預設以 COPY ... FROM STDIN (text format) 串流寫入, 不會先把所有資料組成一個大字串;
+        需要處理衝突時 (on_conflict, 例如 "on conflict do nothing") COPY 無法使用,
+        改以 execute_values 每 INSERT_PAGE_SIZE 筆送出一次。
+        values 可以是 generator, 全程只保留一個批次的資料在記憶體中。
+        """
+        if not self.conn:
+            self.re_connect()
         try:
-            if not self.conn:
-                self.re_connect()
             if not self.cursor:
                 self.cursor = self.conn.cursor()
-            placeholders = ",".join(["%s"] * len(values[0]))
-            args_str = ",".join(
-                self.cursor.mogrify(f"({placeholders})", value).decode("utf-8")
-                for value in values
-            )
-            self.cursor.execute(f"insert into {table_name} values {args_str};")
+            with query_timer("psycopg2", f"copy {table_name} from stdin"):
+                if on_conflict:
+                    stmt = f"insert into {table_name} values %s {on_conflict}"
+                    rows = iter(values)
+                    while chunk := list(itertools.islice(rows, INSERT_PAGE_SIZE)):
+                        psycopg2.extras.execute_values(
+                            self.cursor, stmt, chunk, page_size=INSERT_PAGE_SIZE
+                        )
+                else:
+                    stmt = f"copy {table_name} from stdin"
+                    self.cursor.copy_expert(
+                        stmt, CopyStream(values), size=COPY_BUFFER_SIZE
+                    )
             self.conn.commit()
         except Exception as e:
             logger.error(e)
-            logger.error(
-                f"Error sql statement: insert into {table_name} values {args_str};"
-            )
-            self.conn.rollback()
+            logger.error(f"Error sql statement: {stmt}")
+            self._rollback()
         finally:
             self.close_connect()
 
     def close_connect(self) -> None:
         try:
-            self.cursor.close()
-            self.conn.close()
-            self.cursor = None
-            self.conn = None
+            if self.cursor:
+                self.cursor.close()
         except Exception as e:
             logger.error(e)
+        finally:
+            # 連線歸還連線池而不是關閉
+            get_pool().putconn(self.conn)
+            self.cursor = None
+            self.conn = None
@@ -0,0 +1,253 @@
+'''
+psycopg2 連線池
+每個 process 共用一個有上下限的連線池, PsqlEngine 從這裡借出/歸還連線,
+取代原本每次查詢都 psycopg2.connect() 再 close() 的做法。
+'''
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any
+
+import psycopg2
+import psycopg2.extensions
+from loguru import logger
+
+from .config import settings
+
+
+class PoolTimeout(Exception):
+    """在 timeout 時間內借不到連線"""
+
+
+class PreparedConnection(psycopg2.extensions.connection):
+    """
+    附帶 prepared statement 快取的連線, key 為 SQL 文字, value 為 server 端的名稱。
+    prepared statement 只存在於該連線的 session, 因此快取跟著連線走。
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.prepared: OrderedDict[str, str] = OrderedDict()
+        self.prepared_seq = 0
+
+
+class PsqlPool:
+    def __init__(
+        self,
+        *,
+        min_size: int,
+        max_size: int,
+        timeout: float,
+        max_idle: float,
+        **conn_kwargs: Any,
+    ) -> None:
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min={min_size}, max={max_size}")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        # 閒置超過 max_idle 秒的連線, 借出前先 select 1 檢查是否還活著
+        self.max_idle = max_idle
+        self._conn_kwargs = conn_kwargs
+        self._cond = threading.Condition()
+        # (connection, 最後歸還時間)
+        self._idle: deque[tuple[Any, float]] = deque()
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+        self._stats = {
+            "connections_opened": 0,
+            "connections_discarded": 0,
+            "checkouts": 0,
+            "checkout_timeouts": 0,
+            "checkout_wait_ms": 0.0,
+        }
+
+    def _connect(self):
+        conn = psycopg2.connect(
+            connection_factory=PreparedConnection, **self._conn_kwargs
+        )
+        conn.set_session(autocommit=False)
+        with self._cond:
+            self._stats["connections_opened"] += 1
+        return conn
+
+    def prefill(self) -> None:
+        """預先建立 min_size 條連線"""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            self._put_idle(conn)
+
+    def _is_healthy(self, conn, idle_since: float) -> bool:
+        if conn.closed:
+            return False
+        status = conn.get_transaction_status()
+        if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if time.monotonic() - idle_since < self.max_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("select 1")
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"Discard broken pooled connection: {e}")
+            return False
+
+    def getconn(self, wait: bool = True):
+        """wait=False 時沒有可用連線 (閒置或可新建) 就立即回傳 None, 不等待"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            conn = None
+            idle_since = 0.0
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed")
+                    if self._idle:
+                        conn, idle_since = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    if not wait:
+                        return None
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["checkout_timeouts"] += 1
+                        raise PoolTimeout(
+                            f"Couldn't get a connection after {self.timeout:.1f} sec"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(conn, idle_since):
+                self._discard(conn)
+                continue
+
+            with self._cond:
+                self._stats["checkouts"] += 1
+                self._stats["checkout_wait_ms"] += (time.monotonic() - start) * 1000
+            return conn
+
+    def putconn(self, conn, discard: bool = False) -> None:
+        if conn is None:
+            return
+        if not discard and not conn.closed:
+            status = conn.get_transaction_status()
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                # 呼叫端沒有 commit/rollback 的交易一律 rollback 再放回
+                try:
+                    conn.rollback()
+                except Exception:
+                    discard = True
+        if discard or conn.closed or self._closed:
+            self._discard(conn)
+            return
+        self._put_idle(conn)
+
+    def _put_idle(self, conn) -> None:
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _discard(self, conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._stats["connections_discarded"] += 1
+            self._cond.notify()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self) -> dict[str, Any]:
+        with self._cond:
+            return {
+                "pid": os.getpid(),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "pool_size": self._size,
+                "pool_available": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "requests_waiting": self._waiting,
+                **self._stats,
+            }
+
+
+_pool: PsqlPool | None = None
+_pool_pid: int | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> PsqlPool:
+    """
+    取得 process 共用的連線池, 第一次呼叫時建立。
+    fork 之後的子 process 不能沿用父 process 的連線, 因此以 pid 判斷是否重建。
+    """
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            _pool = PsqlPool(
+                min_size=settings.PG_POOL_MIN_SIZE,
+                max_size=settings.PG_POOL_MAX_SIZE,
+                timeout=settings.PG_POOL_TIMEOUT,
+                max_idle=settings.PG_POOL_MAX_IDLE,
+                dbname=settings.POSTGRES_DB,
+                user=settings.POSTGRES_USER,
+                password=settings.POSTGRES_PASSWORD,
+                host=settings.POSTGRES_SERVER,
+                port=settings.POSTGRES_PORT,
+            )
+            _pool_pid = pid
+    return _pool
+
+
+def close_pool() -> None:
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+        _pool_pid = None
+
+
+def pool_stats() -> dict[str, Any]:
+    return get_pool().stats()
@@ -0,0 +1,141 @@
+'''
+SQL 指紋與慢查詢紀錄
+每次查詢的執行時間依「指紋」彙總: 字串、數字等常值與 IN (...) 清單都換成 ?,
+f-string 拼出來的 SQL 也能歸在同一組。每組保留次數、總時間、最大值與最近
+QUERY_STATS_WINDOW 次的時間 (計算 p95)。
+超過 SLOW_QUERY_MS 的查詢以 warning 記錄, 並附上 EXPLAIN 的執行計畫
+(同一個指紋 SLOW_QUERY_EXPLAIN_INTERVAL 秒內只 EXPLAIN 一次)。
+由 GET /utils/query-stats/ 查看, 資料存在各 worker 的記憶體中。
+'''
+
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any
+
+from loguru import logger
+
+from app.core.config import settings
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.$])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.IGNORECASE)
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<![:\w]):\w+\b")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ARRAY = re.compile(r"array\[\s*\?(?:\s*,\s*\?)*\s*\]", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+# 只有這些語句可以 EXPLAIN
+_EXPLAINABLE = re.compile(r"^\s*(select|insert|update|delete|with)\b", re.IGNORECASE)
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(stmt: str) -> str:
+    # where email = 'a@b.c' and id in (1, 2, 3) -> where email = ? and id in (?)
+    text = _STRING.sub("?", stmt)
+    text = _PLACEHOLDER.sub("?", text)
+    text = _NUMBER.sub("?", text)
+    text = _LIST.sub("(?)", text)
+    text = _ARRAY.sub("array[?]", text)
+    return _SPACE.sub(" ", text).strip().lower()
+
+
+def explainable(stmt: str) -> bool:
+    return bool(_EXPLAINABLE.match(stmt))
+
+
+@dataclass
+class QueryAggregate:
+    fingerprint: str
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    slow: int = 0
+    samples: deque = field(default_factory=deque)
+    explained_at: float = 0.0
+
+    def p95(self) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "fingerprint": self.fingerprint,
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+            "p95_ms": round(self.p95() * 1000, 3),
+            "slow": self.slow,
+        }
+
+
+class QueryStats:
+    def __init__(
+        self, maxsize: int, window: int, slow_ms: float, explain_interval: float
+    ) -> None:
+        self.maxsize = maxsize
+        self.window = window
+        self.slow_ms = slow_ms
+        self.explain_interval = explain_interval
+        # LRU: 超過 maxsize 時淘汰最久沒有執行的指紋
+        self._data: OrderedDict[str, QueryAggregate] = OrderedDict()
+        # sync 的 PsqlEngine 會在 threadpool 中執行, 需要鎖
+        self._lock = threading.Lock()
+
+    def record(self, stmt: str, elapsed: float) -> bool:
+        """記錄一次執行, 回傳是否需要 EXPLAIN (慢查詢且最近沒有 EXPLAIN 過)"""
+        key = fingerprint(stmt)
+        is_slow = elapsed * 1000 >= self.slow_ms
+        with self._lock:
+            agg = self._data.get(key)
+            if agg is None:
+                agg = self._data[key] = QueryAggregate(
+                    key, samples=deque(maxlen=self.window)
+                )
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+            else:
+                self._data.move_to_end(key)
+            agg.count += 1
+            agg.total += elapsed
+            agg.max = max(agg.max, elapsed)
+            agg.samples.append(elapsed)
+            if not is_slow:
+                return False
+            agg.slow += 1
+            now = time.monotonic()
+            if not explainable(stmt) or now - agg.explained_at < self.explain_interval:
+                logger.warning(f"Slow query {elapsed * 1000:.1f} ms: {key}")
+                return False
+            agg.explained_at = now
+            return True
+
+    def top(self, order_by: str = "total", limit: int = 50) -> list[dict[str, Any]]:
+        with self._lock:
+            rows = [agg.as_dict() for agg in self._data.values()]
+        key = f"{order_by}_ms" if order_by in ("total", "mean", "max", "p95") else order_by
+        rows.sort(key=lambda row: row[key], reverse=True)
+        return rows[:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+def log_slow_query(stmt: str, elapsed: float, plan: list[str] | None) -> None:
+    plan_text = "\n".join(plan) if plan else "(no plan)"
+    logger.warning(
+        f"Slow query {elapsed * 1000:.1f} ms: {fingerprint(stmt)}\n{plan_text}"
+    )
+
+
+query_stats = QueryStats(
+    maxsize=settings.QUERY_STATS_SIZE,
+    window=settings.QUERY_STATS_WINDOW,
+    slow_ms=settings.SLOW_QUERY_MS,
+    explain_interval=settings.SLOW_QUERY_EXPLAIN_INTERVAL,
+)
@@ -1,15 +1,30 @@
 from datetime import datetime, timedelta, timezone
+from functools import cache
 from typing import Any
 
 import jwt
+from app.core.cache import TTLCache
 from app.core.config import settings
-from passlib.context import CryptContext
+from app.models import TokenPayload
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+@cache
+def pwd_context():
+    # passlib / bcrypt 只在第一次 hash/verify 時載入 (通常在 password_pool 的子 process),
+    # 不拖慢 app.main 的 import
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 ALGORITHM = "HS256"
 
+# 已驗證過的 token -> claims, 同一個 token 重複請求時略過 HMAC 驗證與 pydantic 驗證
+# 每筆快取的存活時間不會超過 token 本身的 exp
+token_claims_cache: TTLCache[str, TokenPayload] = TTLCache(
+    maxsize=settings.TOKEN_CACHE_SIZE, ttl=settings.TOKEN_CACHE_TTL
+)
+
 
 def create_access_token(subject: str | Any, expires_delta: timedelta) -> str:
     expire = datetime.now(timezone.utc) + expires_delta
@@ -18,9 +33,26 @@ def create_access_token(subject: str | Any, expires_delta: timedelta) -> str:
     return encoded_jwt
 
 
+def decode_access_token(token: str) -> TokenPayload:
+    """
+    驗證並解析 access token, 失敗時拋出 InvalidTokenError / ValidationError
+    """
+    token_data = token_claims_cache.get(token)
+    if token_data is not None:
+        return token_data
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
+    token_data = TokenPayload(**payload)
+    ttl = settings.TOKEN_CACHE_TTL
+    if "exp" in payload:
+        ttl = min(ttl, payload["exp"] - datetime.now(timezone.utc).timestamp())
+    if ttl > 0:
+        token_claims_cache.set(token, token_data, ttl=ttl)
+    return token_data
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
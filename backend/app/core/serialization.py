@@ -0,0 +1,42 @@
+'''
+回應序列化
+FastAPI 對 response_model 的預設流程是: 驗證回傳值 -> jsonable_encoder 轉成 dict/list -> json.dumps,
+從資料庫讀出的 row 已經是合法的 model, 再驗證一次只是浪費時間。
+這裡預先建立常用型別的 TypeAdapter, 由 json_response 直接以 pydantic-core 序列化成 bytes,
+略過重複驗證與 jsonable_encoder; 其他 route 則由 app.main 設定的 ORJSONResponse 輸出。
+比較見 benchmarks/serialization.py。
+'''
+
+from typing import Any
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from app.models import CartResponse, Production, ProductionsPublic
+
+production_list_adapter = TypeAdapter(list[Production])
+productions_page_adapter = TypeAdapter(ProductionsPublic)
+cart_response_adapter = TypeAdapter(CartResponse)
+
+
+def json_response(
+    adapter: TypeAdapter,
+    value: Any,
+    *,
+    validate: bool = False,
+    status_code: int = 200,
+    headers: dict[str, str] | None = None,
+) -> Response:
+    """
+    以 adapter 直接序列化 value 並回傳 Response。
+    validate=False (預設) 時信任 value 已符合型別, 例如直接從資料庫讀出的 row;
+    來源不可信 (例如外部輸入組成的 dict) 時設為 True 先驗證。
+    """
+    if validate:
+        value = adapter.validate_python(value, from_attributes=True)
+    return Response(
+        content=adapter.dump_json(value),
+        status_code=status_code,
+        media_type="application/json",
+        headers=headers,
+    )
@@ -2,19 +2,26 @@ from typing import Any
 import uuid
 from sqlmodel import Session, select
 
-from app.core.pg_engine import PsqlEngine
-from app.core.security import get_password_hash, verify_password
+from app.core.async_pg_engine import AsyncPsqlEngine
+from app.core.cache import principal_cache
+from app.core.password_pool import password_hasher
 from app.models import User, UserCreate, UserUpdate
 from datetime import timedelta, datetime, timezone
 
-def create_user(*, pg:PsqlEngine, user_create: UserCreate) -> User:
+# 最常用的兩個查詢, 以固定的 SQL 文字執行 prepared statement
+GET_USER_BY_EMAIL = "select * from app.customs where email = %s"
+GET_USER_BY_CUSTOMER_ID = "select * from app.customs where customer_id = %s"
+
+async def create_user(*, pg: AsyncPsqlEngine, user_create: UserCreate) -> User:
     customer_id = str(uuid.uuid4())
+    # bcrypt 是 CPU 密集運算, 交給 process pool 避免卡住 event loop
+    hashed_password = await password_hasher.hash(user_create.password)
     pay_methods = ['credit_card','line_pay']
     stmt =[(f'{customer_id}',
             f'{user_create.customer_name}',
             f'{user_create.email}',
             f'{user_create.phone_number}',
-            f'{get_password_hash(user_create.password)}',
+            f'{hashed_password}',
             f'{user_create.address}',
             pay_methods,
             False,
@@ -23,7 +30,7 @@ def create_user(*, pg:PsqlEngine, user_create: UserCreate) -> User:
             datetime.now(timezone.utc).date() + timedelta(days=365),
             0
             )]
-    pg.insert_mogrify("app.customs", stmt)
+    await pg.insert_mogrify("app.customs", stmt)
     return customer_id
 
 
@@ -40,33 +47,40 @@ def create_user(*, pg:PsqlEngine, user_create: UserCreate) -> User:
 #     session.refresh(db_user)
 #     return db_user
 
-def update_user(*, pg: PsqlEngine, email: str, update_data: dict):
-    # 組合 SQL SET 子句
-    set_clause = ", ".join([
-        f"{key} = {value}"  # 防止 SQL injection
-        for key, value in update_data.items()
-    ])
+async def update_user(*, pg: AsyncPsqlEngine, email: str, update_data: dict):
+    # 組合 SQL SET 子句, 欄位名稱來自程式碼, 值一律以參數傳入防止 SQL injection
+    set_clause = ", ".join([f"{key} = %s" for key in update_data])
 
     stmt = f"""
         UPDATE app.customs
         SET {set_clause}
-        WHERE email = '{email}';
+        WHERE email = %s;
     """
-    
-    print(stmt)
-    pg.execute_cmd(stmt)
+    await pg.execute_cmd(stmt, params=[*update_data.values(), email])
+    principal_cache.invalidate_email(email)
 
     # 更新後重新讀取使用者並回傳
-    return get_user_by_email(pg=pg, email=email)
+    return await get_user_by_email(pg=pg, email=email)
 
-def get_user_by_email(*, pg: PsqlEngine, email: str) -> User | None:
+async def get_user_by_email(*, pg: AsyncPsqlEngine, email: str) -> User | None:
     """
     根據 email 取得 user 資料
     """
-    stmt = f"""
-    select * from app.customs where email = '{email}'; 
+    user = await pg.execute_query(
+        GET_USER_BY_EMAIL, first=True, params=(email,), prepare=True
+    )
+    return user
+
+
+async def get_user_by_customer_id(
+    *, pg: AsyncPsqlEngine, customer_id: str
+) -> User | None:
+    """
+    根據 customer_id 取得 user 資料, 每個登入後的請求都會呼叫
     """
-    user = pg.execute_query(stmt, first=True)
+    user = await pg.execute_query(
+        GET_USER_BY_CUSTOMER_ID, first=True, params=(customer_id,), prepare=True
+    )
     return user
 
 
@@ -76,30 +90,32 @@ def get_user_by_user_id(*, session: Session, user_id: str) -> User | None:
     return session_user
 
 
-def authenticate(*, pg: PsqlEngine, email: str, password: str) -> User | None:
+async def authenticate(*, pg: AsyncPsqlEngine, email: str, password: str) -> User | None:
     # 根據 email 取得資料庫中使用者的所有訊息
-    db_user = get_user_by_email(pg=pg, email=email)
+    db_user = await get_user_by_email(pg=pg, email=email)
     if not db_user:  # 回傳空則跳開
         return None
     # 驗證請求中的密碼是否與 hashed_password 解開後的一致
-    if not verify_password(password, db_user.password):
+    if not await password_hasher.verify(password, db_user.password):
         return None
     return db_user
 
 
-def update_login_time(*, pg: PsqlEngine, email: str):
-    stmt = f"""
+async def update_login_time(*, pg: AsyncPsqlEngine, email: str):
+    stmt = """
         UPDATE app.customs
         SET last_login = NOW()
-        WHERE email = '{email}';
+        WHERE email = %s;
     """
-    pg.execute_cmd(stmt)
+    await pg.execute_cmd(stmt, params=(email,), prepare=True)
+    principal_cache.invalidate_email(email)
 
 
-def update_password(*, pg: PsqlEngine, email: str, hashed_password: str):
-    stmt = f"""
+async def update_password(*, pg: AsyncPsqlEngine, email: str, hashed_password: str):
+    stmt = """
         UPDATE app.customs
-        SET password = '{hashed_password}'
-        WHERE email = '{email}';
+        SET password = %s
+        WHERE email = %s;
     """
-    pg.execute_cmd(stmt)
+    await pg.execute_cmd(stmt, params=(hashed_password, email))
+    principal_cache.invalidate_email(email)
@@ -3,16 +3,77 @@
 All API : Cert_POC/backend/app/api/router.py
 允許跨域請求: .env 的 BACKEND_CORS_ORIGINS
 API URL path 開頭: .env 的 API_V1_STR
+資料庫連線池: 由 lifespan 在啟動時建立並預熱, 關閉時釋放 (app/core/db.py)
+bcrypt process pool: 由 lifespan 啟動與關閉 (app/core/password_pool.py)
+登入/重設密碼/註冊的流量管制: 超過額度回 429 (app/core/admission.py)
+回應壓縮: gzip / brotli, 帶 ETag 的回應快取壓縮結果 (app/core/compression.py)
+readiness: GET /ready, 連線池預熱完成前回 503 (多 worker 啟動方式見 app/serve.py)
+監控指標: GET /metrics (Prometheus 格式, app/core/metrics.py), 需帶 METRICS_TOKEN
+商品圖片縮圖 process pool: 由 lifespan 啟動與關閉 (app/core/images.py)
+email 樣板: 啟動時預先編譯 (app/core/email_templates.py)
+背景寄信 worker: 由 lifespan 啟動與停止 (app/core/email_outbox.py)
+購物車儲存: 記憶體模式的背景寫回由 lifespan 啟動, 關閉時寫回全部購物車 (app/core/cart_store.py)
 '''
 
-from fastapi import FastAPI
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 
+from app.api.deps import verify_metrics_token
 from app.api.router import api_router
+from app.core.admission import AdmissionRejected, retry_after_header
+from app.core.cart_store import cart_store
+from app.core.compression import CompressionMiddleware
 from app.core.config import settings
+from app.core.db import db
+from app.core.email_outbox import email_outbox
+from app.core.email_templates import precompile_templates
+from app.core.images import image_store
+from app.core.metrics import MetricsMiddleware, registry, render_gauges
+from app.core.password_pool import PasswordHasherBusy, password_hasher
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await db.startup()
+    precompile_templates()
+    password_hasher.start()
+    image_store.start()
+    await cart_store.start()
+    await email_outbox.start()
+    yield
+    await email_outbox.close()
+    await cart_store.close()
+    image_store.shutdown()
+    await password_hasher.shutdown()
+    await db.shutdown()
+
+
+# 一般 route 以 orjson 輸出; 大量資料的 route 改用 app/core/serialization.py 的 json_response
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
-app = FastAPI()
+
+# bcrypt process pool 排隊已滿時直接拒絕, 讓用戶端稍後重試
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "伺服器忙碌中, 請稍後再試"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": "請求過於頻繁, 請稍後再試"},
+        headers={"Retry-After": retry_after_header(exc.retry_after)},
+    )
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,9 +83,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(CompressionMiddleware)
+
+# 最外層, 延遲包含 CORS、壓縮與其他 middleware 的處理時間
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
+
+
+@app.get("/ready", include_in_schema=False)
+def ready() -> JSONResponse:
+    if not db.ready:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"ready": False}
+        )
+    return JSONResponse(content={"ready": True, "pid": os.getpid()})
+
+
+@app.get(
+    "/metrics", include_in_schema=False, dependencies=[Depends(verify_metrics_token)]
+)
+def metrics() -> PlainTextResponse:
+    extra = (
+        render_gauges("db_pool", "SQLAlchemy connection pool state", db.stats())
+        + render_gauges(
+            "password_hasher", "bcrypt process pool state", password_hasher.stats()
+        )
+        + render_gauges("email_outbox", "Email outbox counters", email_outbox.stats())
+        + render_gauges("cart_store", "Cart store state", cart_store.stats())
+        + render_gauges("image_store", "Image variant cache", image_store.stats())
+    )
+    return PlainTextResponse(
+        registry.render(extra), media_type="text/plain; version=0.0.4"
+    )
+
+
 # 將圖片路徑一併納入服務中供前端取用
-img_path = "/home/omni/Cert_POC/frontend/public/production_picture"
+# 商品目錄已改用 /images 的縮圖網址, 這裡保留給仍使用原始路徑的舊資料
+img_path = settings.PRODUCTION_PICTURE_DIR
 app.mount(img_path, StaticFiles(directory=img_path), name="production_picture")
 # app.mount("/production_picture", StaticFiles(directory="/home/omni/Cert_POC/frontend/public/production_picture"), name="production_picture")
-
@@ -0,0 +1,120 @@
+'''
+合併重複的未結帳購物車並建立 ux_orders_open_cart
+ux_orders_open_cart 限制每位客戶最多一台未結帳 (status = true) 的購物車, 購物車的 upsert 依賴此索引。
+舊版 add_to_cart 併發時可能替同一位客戶建立多台購物車, 直接建立 unique index 會失敗,
+因此在同一個交易中:
+  1. 鎖定 app.orders, 避免執行期間再產生新的購物車
+  2. 每位客戶保留最早建立的購物車, 其他購物車的商品移到保留的購物車
+  3. 以商品重新計算保留購物車的 total_amount, 刪除其餘購物車
+  4. 建立 ux_orders_open_cart
+只需執行一次, 索引已存在時不做任何事。於 backend 目錄執行:
+    python -m app.migrations.merge_open_carts --dry-run
+    python -m app.migrations.merge_open_carts
+'''
+
+import argparse
+import asyncio
+
+from sqlalchemy import text
+
+from app.core.db import db
+from app.models import Order
+
+INDEX_NAME = "ux_orders_open_cart"
+
+DUPLICATE_CARTS = """
+    create temporary table duplicate_carts on commit drop as
+    select order_id, keep_id
+    from (
+        select order_id,
+            first_value(order_id) over (
+                partition by customer_id order by created_date, order_id
+            ) as keep_id
+        from app.orders
+        where status
+    ) ranked
+    where order_id <> keep_id
+"""
+
+MOVE_ITEMS = """
+    update app.order_items i
+    set order_id = d.keep_id
+    from duplicate_carts d
+    where i.order_id = d.order_id
+"""
+
+RECOMPUTE_TOTALS = """
+    update app.orders o
+    set total_amount = coalesce(
+            (
+                select sum(i.quantity * i.price_at_order_time)
+                from app.order_items i
+                where i.order_id = o.order_id
+            ),
+            0
+        ),
+        updated_date = now()
+    where o.order_id in (select distinct keep_id from duplicate_carts)
+"""
+
+DELETE_DUPLICATES = """
+    delete from app.orders where order_id in (select order_id from duplicate_carts)
+"""
+
+
+async def migrate(dry_run: bool) -> None:
+    index = next(i for i in Order.__table__.indexes if i.name == INDEX_NAME)
+    engine = db.get_engine()
+    async with engine.begin() as conn:
+        exists = (
+            await conn.execute(
+                text(
+                    "select 1 from pg_indexes where schemaname = 'app' and indexname = :name"
+                ),
+                {"name": INDEX_NAME},
+            )
+        ).first()
+        if exists:
+            print(f"{INDEX_NAME} 已存在, 不需要執行")
+            return
+        await conn.execute(text("lock table app.orders in share row exclusive mode"))
+        await conn.execute(text(DUPLICATE_CARTS))
+        duplicates, customers = (
+            await conn.execute(
+                text(
+                    """
+                    select count(*), count(distinct o.customer_id)
+                    from duplicate_carts d join app.orders o on o.order_id = d.order_id
+                    """
+                )
+            )
+        ).one()
+        print(f"{customers} 位客戶有重複的購物車, 共 {duplicates} 台需要合併")
+        if dry_run:
+            await conn.rollback()
+            return
+        moved = (await conn.execute(text(MOVE_ITEMS))).rowcount
+        await conn.execute(text(RECOMPUTE_TOTALS))
+        await conn.execute(text(DELETE_DUPLICATES))
+        await conn.run_sync(lambda sync_conn: index.create(sync_conn))
+        print(f"已移動 {moved} 筆商品, 刪除 {duplicates} 台購物車, 建立 {INDEX_NAME}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--dry-run", action="store_true", help="只列出重複的購物車數量, 不修改資料"
+    )
+    args = parser.parse_args()
+
+    async def _main() -> None:
+        try:
+            await migrate(args.dry_run)
+        finally:
+            await db.shutdown()
+
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ from datetime import date, datetime
 from typing import List, Optional
 
 from pydantic import BaseModel, EmailStr
+from sqlalchemy import Index, text
 from sqlmodel import Field, Relationship, SQLModel
 
 
@@ -29,7 +30,24 @@ class UserPublic(SQLModel):
 
 class Production(SQLModel, table=True):
     __tablename__ = "production"  # 明確指定資料表名稱
-    __table_args__ = {"schema": "app"}  # 指定 schema
+    __table_args__ = (
+        # keyset 分頁 (created_at, license_id) 與常用篩選條件的索引
+        Index("ix_production_created_at_license_id", "created_at", "license_id"),
+        Index(
+            "ix_production_display_status",
+            "display_status",
+            "created_at",
+            "license_id",
+        ),
+        Index(
+            "ix_production_registration_window",
+            "registration_end",
+            "registration_start",
+        ),
+        Index("ix_production_exam_location", "exam_location"),
+        Index("ix_production_exam_date", "exam_date"),
+        {"schema": "app"},  # 指定 schema
+    )
 
     license_id: str = Field(primary_key=True)
     license_name: Optional[str] = None
@@ -44,6 +62,12 @@ class Production(SQLModel, table=True):
     picture_url: Optional[str] = None
 
 
+# 商品目錄分頁, next_cursor 為 None 代表沒有下一頁
+class ProductionsPublic(SQLModel):
+    data: list[Production]
+    next_cursor: str | None = None
+
+
 class ordercheck(BaseModel):
     User_ID: int
     custom_name: str
@@ -74,7 +98,19 @@ class OrderItem(SQLModel, table=True):
 
 class Order(SQLModel, table=True):
     __tablename__ = "orders"
-    __table_args__ = {"schema": "app"}  # 指定 schema
+    __table_args__ = (
+        # 每位客戶最多一台未結帳的購物車, add_to_cart 以此做 upsert
+        # 既有資料可能有重複的購物車, 不由 init_db 補建, 需執行
+        # python -m app.migrations.merge_open_carts (新建立的資料表則由 create_all 一併建立)
+        Index(
+            "ux_orders_open_cart",
+            "customer_id",
+            unique=True,
+            postgresql_where=text("status"),
+            info={"migration": "app.migrations.merge_open_carts"},
+        ),
+        {"schema": "app"},  # 指定 schema
+    )
 
     order_id: Optional[int] = Field(default=None, primary_key=True)
     customer_id: str
@@ -89,6 +125,33 @@ class Order(SQLModel, table=True):
     items: List[OrderItem] = Relationship(back_populates="order")
 
 
+# 待寄送的信件, 由 app/core/email_outbox.py 的背景 worker 寄出
+class EmailOutbox(SQLModel, table=True):
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        # worker 只撈取 pending / sending 且到了重試時間的信件
+        Index(
+            "ix_email_outbox_due",
+            "next_attempt_at",
+            postgresql_where=text("status in ('pending', 'sending')"),
+        ),
+        {"schema": "app"},
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    email_to: str = Field(max_length=255)
+    subject: str
+    # 寄出或放棄後清空, 不在資料庫留下信件中的 token
+    html_content: str
+    # pending: 等待寄送; sending: worker 已領取; sent: 已寄出; failed: 超過重試次數
+    status: str = Field(default="pending", max_length=10)
+    attempts: int = 0
+    next_attempt_at: datetime = Field(default_factory=datetime.now)
+    last_error: Optional[str] = None
+    created_date: datetime = Field(default_factory=datetime.now)
+    sent_date: Optional[datetime] = None
+
+
 # Pydantic 模型用於請求和回應
 class CartItemCreate(BaseModel):
     license_id: str
@@ -0,0 +1,217 @@
+'''
+正式環境啟動
+`fastapi dev` 只有一個 process 並監看檔案變動, 適合開發; 正式環境改用:
+    python -m app.serve --host 0.0.0.0 --port 8000
+主 process 先 bind socket, 再 pre-fork 多個 uvicorn worker 共用同一個 socket:
+  - worker 數量: --workers / SERVE_WORKERS, 0 表示依可用 CPU 數
+  - 每個 worker 的 PG_POOL_MAX_SIZE = DB_CONNECTION_BUDGET // worker 數,
+    所有 worker 合計不超過資料庫可用的連線數
+  - 每個 worker 處理 SERVE_MAX_REQUESTS (加上 0~SERVE_MAX_REQUESTS_JITTER 的隨機數) 個請求後
+    正常結束並由主 process 補上新的 worker, 錯開時間避免同時重啟
+  - 收到 SIGTERM / SIGINT 時轉送給所有 worker, worker 停止接收新連線,
+    等待處理中的請求 (最多 SERVE_GRACEFUL_TIMEOUT 秒) 並執行 lifespan 的關閉流程
+    (寫回購物車、停止寄信 worker 等) 後結束
+  - 異常結束的 worker 自動重啟
+worker 啟動時 lifespan 預熱連線池, GET /ready 在預熱完成前回 503, 可作為負載平衡的 readiness 檢查。
+建立資料表與索引 (init_db) 由主 process 在 fork 前執行一次, worker 不再各自執行 DDL。
+多個 worker 時必須:
+  - 在 .env 設定 SECRET_KEY, 否則每個 worker 各自產生隨機的 key, 其他 worker 簽發的 token 無法驗證
+  - CART_STORE_MODE=database, 記憶體購物車只存在於單一 worker, 多個 worker 寫回同一台購物車會互相覆蓋
+不符合時拒絕啟動。
+注意每個 worker 各自有 bcrypt / 縮圖 process pool 與快取, process 總數約為
+worker 數 x (1 + PASSWORD_HASH_WORKERS + IMAGE_WORKERS)。
+'''
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Any
+
+import uvicorn
+from loguru import logger
+
+from app.core.config import settings
+
+# 啟動後這麼多秒內就異常結束的 worker (例如資料庫無法連線), 延後重啟避免不斷重試
+RESPAWN_BACKOFF = 5.0
+# 等待 worker 結束時, 在 graceful timeout 之外保留給 lifespan 關閉流程的秒數
+SHUTDOWN_MARGIN = 15.0
+
+
+def available_cpus() -> int:
+    # container 或 taskset 限制 CPU 時以實際可用的數量為準
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def check_multi_worker_settings(workers: int) -> list[str]:
+    """回傳多個 worker 時不安全的設定"""
+    if workers <= 1:
+        return []
+    problems = []
+    # 未設定 (或為空值) 時 SECRET_KEY 為每個 process 各自產生的隨機值
+    if "SECRET_KEY" not in settings.model_fields_set:
+        problems.append("SECRET_KEY must be set in .env")
+    if settings.CART_STORE_MODE != "database":
+        problems.append(
+            f"CART_STORE_MODE={settings.CART_STORE_MODE} keeps carts in one worker's "
+            "memory, use CART_STORE_MODE=database"
+        )
+    return problems
+
+
+async def prepare_database() -> None:
+    from app.core.db import db, init_db
+
+    try:
+        await init_db(db.get_engine())
+    finally:
+        await db.shutdown()
+
+
+def pool_size_per_worker(budget: int, workers: int) -> int:
+    if budget < workers:
+        logger.warning(
+            f"DB_CONNECTION_BUDGET={budget} is less than {workers} workers, "
+            "each worker still gets 1 connection"
+        )
+    return max(1, budget // workers)
+
+
+def run_worker(sockets: list[socket.socket], options: dict[str, Any]) -> None:
+    """在 worker process 中執行: 以主 process 傳來的 socket 啟動 uvicorn"""
+    # 離開主 process 的 process group, 終端機的 Ctrl-C 只送給主 process, 再由主 process 轉送 SIGTERM;
+    # 否則 worker 會連續收到兩次訊號, uvicorn 會視為強制結束而不等待處理中的請求
+    os.setpgrp()
+    config = uvicorn.Config("app.main:app", **options)
+    config.configure_logging()
+    uvicorn.Server(config).run(sockets=sockets)
+
+
+class Supervisor:
+    def __init__(self, args: argparse.Namespace, sockets: list[socket.socket]) -> None:
+        self.args = args
+        self.sockets = sockets
+        self.context = multiprocessing.get_context("spawn")
+        self.processes: list[Any] = []
+        self.started_at: list[float] = []
+        self.should_exit = threading.Event()
+
+    def worker_options(self) -> dict[str, Any]:
+        max_requests = None
+        if self.args.max_requests > 0:
+            max_requests = self.args.max_requests + random.randint(
+                0, max(0, self.args.max_requests_jitter)
+            )
+        return {
+            # 啟動 (連線池預熱) 失敗時讓 worker 結束, 不以未就緒的狀態接收請求
+            "lifespan": "on",
+            "limit_max_requests": max_requests,
+            "timeout_graceful_shutdown": self.args.graceful_timeout,
+            "log_level": self.args.log_level,
+        }
+
+    def spawn(self) -> Any:
+        process = self.context.Process(
+            target=run_worker, args=(self.sockets, self.worker_options())
+        )
+        process.start()
+        logger.info(f"Started worker {process.pid}")
+        return process
+
+    def handle_signal(self, signum: int, frame: Any) -> None:
+        self.should_exit.set()
+
+    def run(self) -> None:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, self.handle_signal)
+        for _ in range(self.args.workers):
+            self.processes.append(self.spawn())
+            self.started_at.append(time.monotonic())
+        while not self.should_exit.wait(0.5):
+            self.respawn_dead_workers()
+        self.drain()
+
+    def respawn_dead_workers(self) -> None:
+        for i, process in enumerate(self.processes):
+            if process.is_alive():
+                continue
+            uptime = time.monotonic() - self.started_at[i]
+            if process.exitcode != 0 and uptime < RESPAWN_BACKOFF:
+                continue
+            process.join()
+            if process.exitcode == 0:
+                logger.info(f"Worker {process.pid} recycled after max requests")
+            else:
+                logger.error(f"Worker {process.pid} exited with code {process.exitcode}")
+            self.processes[i] = self.spawn()
+            self.started_at[i] = time.monotonic()
+
+    def drain(self) -> None:
+        logger.info("Shutting down workers, waiting for in-flight requests")
+        for process in self.processes:
+            if process.is_alive():
+                # uvicorn 收到 SIGTERM 即停止接收新連線並等待處理中的請求
+                process.terminate()
+        deadline = time.monotonic() + self.args.graceful_timeout + SHUTDOWN_MARGIN
+        for process in self.processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Worker {process.pid} did not stop in time, killing it")
+                process.kill()
+                process.join()
+        for sock in self.sockets:
+            sock.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=settings.SERVE_WORKERS)
+    parser.add_argument("--db-budget", type=int, default=settings.DB_CONNECTION_BUDGET)
+    parser.add_argument("--max-requests", type=int, default=settings.SERVE_MAX_REQUESTS)
+    parser.add_argument(
+        "--max-requests-jitter", type=int, default=settings.SERVE_MAX_REQUESTS_JITTER
+    )
+    parser.add_argument(
+        "--graceful-timeout", type=float, default=settings.SERVE_GRACEFUL_TIMEOUT
+    )
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    if args.workers <= 0:
+        args.workers = available_cpus()
+    problems = check_multi_worker_settings(args.workers)
+    if problems:
+        for problem in problems:
+            logger.error(f"Refusing to start {args.workers} workers: {problem}")
+        sys.exit(1)
+
+    # 建立資料表與索引只在這裡執行一次, worker 的 lifespan 略過
+    asyncio.run(prepare_database())
+    os.environ["DB_INIT_ON_STARTUP"] = "false"
+
+    # worker 以 spawn 啟動, 重新讀取環境變數, 這裡設定的值優先於 .env
+    pool_size = pool_size_per_worker(args.db_budget, args.workers)
+    os.environ["PG_POOL_MAX_SIZE"] = str(pool_size)
+    os.environ["PG_POOL_MIN_SIZE"] = str(min(settings.PG_POOL_MIN_SIZE, pool_size))
+
+    config = uvicorn.Config("app.main:app", host=args.host, port=args.port)
+    sock = config.bind_socket()
+    logger.info(
+        f"Serving on http://{args.host}:{args.port} with {args.workers} workers, "
+        f"{pool_size} DB connections each (budget {args.db_budget})"
+    )
+    Supervisor(args, [sock]).run()
+
+
+if __name__ == "__main__":
+    main()
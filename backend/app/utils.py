@@ -1,16 +1,16 @@
+import json
 import logging
+from collections.abc import AsyncIterator
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from pathlib import Path
 from typing import Any
-import resend
 import jwt
-from jinja2 import Template
 from jwt.exceptions import InvalidTokenError
 
 from app.core.security import create_access_token
 from app.core import security
 from app.core.config import settings
+from app.core.email_templates import render_template
 from app.models import UserUpdate
 
 logging.basicConfig(level=logging.INFO)
@@ -23,12 +23,18 @@ class EmailData:
     subject: str
 
 
+async def ndjson_stream(rows: AsyncIterator[Any]) -> AsyncIterator[bytes]:
+    """
+    把 AsyncPsqlEngine.iter_query 的結果轉為 NDJSON (一行一筆 JSON),
+    用法: StreamingResponse(ndjson_stream(pg.iter_query(stmt)), media_type="application/x-ndjson")
+    """
+    async for row in rows:
+        yield (json.dumps(row._asdict(), default=str, ensure_ascii=False) + "\n").encode()
+
+
 def render_email_template(*, template_name: str, context: dict[str, Any]) -> str:
-    template_str = (
-        Path(__file__).parent / "email-templates" / template_name
-    ).read_text()
-    html_content = Template(template_str).render(context)
-    return html_content
+    # 使用共用的 jinja2 Environment, 樣板已編譯並快取在記憶體 (app/core/email_templates.py)
+    return render_template(template_name, context)
 
 # # 需要使用 SMTP 的時候請取消註解
 # def send_email(
@@ -56,7 +62,6 @@ def render_email_template(*, template_name: str, context: dict[str, Any]) -> str
 #     logger.info(f"send email result: {response}")
 
 # # 需要使用 EMAIL-API 的時候請取消註解, 此處使用 resend API 發信:https://resend.com/
-resend.api_key = settings.EMAIL_API_KEY
 def send_email(
     *,
     email_to: str,
@@ -64,6 +69,10 @@ def send_email(
     html_content: str = "",
 ) -> None:
     assert settings.emails_enabled, "no provided configuration for email variables"
+    # resend 只在寄信時載入, 不拖慢 app.main 的 import
+    import resend
+
+    resend.api_key = settings.EMAIL_API_KEY
 
     response = resend.Emails.send({
         "from": settings.EMAILS_FROM_EMAIL,
@@ -103,19 +112,19 @@ def generate_reset_password_email(email_to: str, email: str, token: str) -> Emai
 
 
 def generate_new_account_email(
-    email_to: str, username: str, password: str, customer_id:str
+    email_to: str, username: str, customer_id: str
 ) -> EmailData:
     project_name = settings.PROJECT_NAME
     subject = f"{project_name} - New account for user {username}"
+    # 啟用連結只帶帳號識別資料, 不包含密碼
     verify_data = UserUpdate(
             customer_id=customer_id,
             email=email_to,
-            password=password,
             activate=True
         )
 
     token = create_access_token(
-        subject=verify_data.model_dump(),  # dict 會被 encode 成 jwt
+        subject=verify_data.model_dump(exclude_none=True),  # dict 會被 encode 成 jwt
         expires_delta=timedelta(hours=1)  # token 有效時間，可調整
     )
 
@@ -124,7 +133,6 @@ def generate_new_account_email(
         context = {
             "project_name": settings.PROJECT_NAME,
             "username": username,
-            "password": password,
             "email": email_to,
             "link": f"{settings.BACKEND_HOST}/api/users/verify?token={token}",
         }
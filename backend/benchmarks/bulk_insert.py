@@ -0,0 +1,120 @@
+'''
+大量寫入效能比較 (rows/sec)
+  legacy mogrify : 舊版 insert_mogrify, 把所有資料 mogrify 成一個 INSERT 字串
+  sync copy      : PsqlEngine.insert_mogrify, COPY text format 串流
+  sync values    : PsqlEngine.insert_mogrify(on_conflict=...), 分批 execute_values
+  async copy     : AsyncPsqlEngine.insert_mogrify, COPY text format
+  async binary   : AsyncPsqlEngine.insert_mogrify(copy_format="binary")
+  async values   : AsyncPsqlEngine.insert_mogrify(on_conflict=...), 分批 executemany
+需要可連線的 Postgres (.env 設定), 會建立並刪除 public.bench_bulk_insert,
+於 backend 目錄執行:
+    python -m benchmarks.bulk_insert --sizes 10000 100000 1000000
+'''
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Any, Iterator
+
+from app.core.db import db, get_async_pg
+from app.core.pg_engine import PsqlEngine
+
+TABLE = "public.bench_bulk_insert"
+
+
+def make_rows(n: int) -> Iterator[tuple[Any, ...]]:
+    now = datetime.now(timezone.utc)
+    for i in range(n):
+        yield (i, f"license-{i}", i % 5000, now, ["credit_card", "line_pay"])
+
+
+def legacy_insert_mogrify(table_name: str, values: list[tuple[Any, ...]]) -> None:
+    """舊版寫法, 僅供比較"""
+    pg = PsqlEngine().connect_db()
+    cursor = pg.conn.cursor()
+    placeholders = ",".join(["%s"] * len(values[0]))
+    args_str = ",".join(
+        cursor.mogrify(f"({placeholders})", value).decode("utf-8") for value in values
+    )
+    cursor.execute(f"insert into {table_name} values {args_str};")
+    pg.conn.commit()
+    cursor.close()
+    pg.close_connect()
+
+
+def reset_table() -> None:
+    PsqlEngine().execute_cmd(f"truncate {TABLE}")
+
+
+def report(name: str, n: int, elapsed: float) -> None:
+    print(f"{n:>9} rows  {name:<16}{n / elapsed:>14,.0f} rows/sec{elapsed:>10.2f} s")
+
+
+async def run(sizes: list[int], legacy_max: int) -> None:
+    PsqlEngine().execute_cmd(
+        f"""
+        create table if not exists {TABLE} (
+            id int primary key, name text, price int,
+            created_at timestamptz, pay_methods text[]
+        )
+        """
+    )
+    apg = get_async_pg()
+    conflict = "on conflict do nothing"
+    for n in sizes:
+        if n <= legacy_max:
+            reset_table()
+            rows = list(make_rows(n))
+            start = time.perf_counter()
+            legacy_insert_mogrify(TABLE, rows)
+            report("legacy mogrify", n, time.perf_counter() - start)
+
+        sync_variants = {
+            "sync copy": lambda: PsqlEngine().insert_mogrify(TABLE, make_rows(n)),
+            "sync values": lambda: PsqlEngine().insert_mogrify(
+                TABLE, make_rows(n), on_conflict=conflict
+            ),
+        }
+        for name, call in sync_variants.items():
+            reset_table()
+            start = time.perf_counter()
+            call()
+            report(name, n, time.perf_counter() - start)
+
+        async_variants = {
+            "async copy": lambda: apg.insert_mogrify(TABLE, make_rows(n)),
+            "async binary": lambda: apg.insert_mogrify(
+                TABLE, make_rows(n), copy_format="binary"
+            ),
+            "async values": lambda: apg.insert_mogrify(
+                TABLE, make_rows(n), on_conflict=conflict
+            ),
+        }
+        for name, call in async_variants.items():
+            reset_table()
+            start = time.perf_counter()
+            await call()
+            report(name, n, time.perf_counter() - start)
+
+    PsqlEngine().execute_cmd(f"drop table if exists {TABLE}")
+    await db.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument(
+        "--legacy-max",
+        type=int,
+        default=100_000,
+        help="超過此筆數不跑舊版寫法 (會在記憶體中組出超大字串)",
+    )
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes, args.legacy_max))
+
+
+if __name__ == "__main__":
+    main()
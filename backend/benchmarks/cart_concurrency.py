@@ -0,0 +1,129 @@
+'''
+購物車併發壓力測試
+多位客戶同時對自己的購物車併發加入商品, 結束後檢查:
+  - 每位客戶只有一台未結帳的購物車
+  - total_amount 等於所有商品 quantity * price_at_order_time 的總和
+  - 商品筆數等於送出的請求數
+並回報每秒可處理的 add 請求數。
+需要可連線的 Postgres (.env 設定) 且 app.production 至少有一筆商品,
+客戶 id 以 bench-cart- 開頭, 結束時會刪除。於 backend 目錄執行:
+    python -m benchmarks.cart_concurrency --customers 20 --adds 50 --concurrency 100
+'''
+
+import argparse
+import asyncio
+import sys
+import time
+
+import httpx
+
+from app.core.config import settings
+from app.core.db import db, get_async_pg
+from app.main import app
+
+PREFIX = "bench-cart-"
+
+
+async def cleanup() -> None:
+    pg = get_async_pg()
+    await pg.execute_cmd(
+        """
+        delete from app.order_items where order_id in (
+            select order_id from app.orders where customer_id like %s
+        )
+        """,
+        params=(PREFIX + "%",),
+    )
+    await pg.execute_cmd(
+        "delete from app.orders where customer_id like %s", params=(PREFIX + "%",)
+    )
+
+
+async def run(customers: int, adds: int, concurrency: int) -> bool:
+    pg = get_async_pg()
+    product = await pg.execute_query(
+        "select license_id, license_name from app.production limit 1", first=True
+    )
+    if not product:
+        print("app.production 沒有商品資料, 無法測試")
+        return False
+    await cleanup()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    url = f"{settings.API_V1_STR}/cart/add"
+    failures = 0
+
+    async def add(client: httpx.AsyncClient, customer: int, n: int) -> None:
+        nonlocal failures
+        body = {
+            "license_id": product.license_id,
+            "license_name": product.license_name or "",
+            "quantity": n % 3 + 1,
+            "price_at_order_time": 100 + n,
+            "created_by": "benchmark",
+        }
+        params = {"customer_id": f"{PREFIX}{customer}", "customer_name": "bench"}
+        async with semaphore:
+            res = await client.post(url, params=params, json=body)
+        if res.status_code != 200:
+            failures += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(add(client, c, n) for c in range(customers) for n in range(adds))
+        )
+        elapsed = time.perf_counter() - start
+
+    total_requests = customers * adds
+    print(f"{total_requests} adds in {elapsed:.2f} s, {total_requests / elapsed:,.0f} adds/sec")
+    print(f"failed requests: {failures}")
+
+    rows = await pg.execute_query(
+        """
+        select o.customer_id, count(distinct o.order_id) as carts,
+            max(o.total_amount) as total_amount,
+            coalesce(sum(i.quantity * i.price_at_order_time), 0) as items_amount,
+            count(i.id) as items
+        from app.orders o left join app.order_items i on i.order_id = o.order_id
+        where o.customer_id like %s and o.status
+        group by o.customer_id
+        """,
+        params=(PREFIX + "%",),
+    )
+    expected_amount = sum((n % 3 + 1) * (100 + n) for n in range(adds))
+    ok = len(rows) == customers and failures == 0
+    for row in rows:
+        if (
+            row.carts != 1
+            or row.items != adds
+            or row.total_amount != row.items_amount
+            or row.total_amount != expected_amount
+        ):
+            ok = False
+            print(f"MISMATCH {row}")
+    print("totals correct" if ok else "totals INCORRECT")
+    await cleanup()
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, default=20)
+    parser.add_argument("--adds", type=int, default=50, help="每位客戶加入的商品數")
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+
+    async def _main() -> bool:
+        await db.startup()
+        try:
+            return await run(args.customers, args.adds, args.concurrency)
+        finally:
+            await db.shutdown()
+
+    sys.exit(0 if asyncio.run(_main()) else 1)
+
+
+if __name__ == "__main__":
+    main()
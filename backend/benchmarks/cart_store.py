@@ -0,0 +1,156 @@
+'''
+購物車儲存方式比較
+以相同的 add / view 負載分別測試 database (每次直接寫資料庫) 與記憶體購物車
+(write_behind / checkout), 回報每秒處理的 add 與 view 數, 結束前寫回並結帳,
+確認資料庫中的總金額與送出的商品一致。
+直接呼叫 CartStore, 不經過 HTTP, 只比較儲存層本身的成本。
+需要可連線的 Postgres (.env 設定) 且 app.production 至少有一筆商品
+(order_items.license_id 參照 app.production), 客戶 id 以 bench-store- 開頭, 結束時會刪除。於 backend 目錄執行:
+    python -m benchmarks.cart_store --customers 50 --adds 40 --views 4 --concurrency 50
+'''
+
+import argparse
+import asyncio
+import sys
+import time
+
+from app.core.cart_store import CartStore, DatabaseCartStore, MemoryCartStore
+from app.core.db import db, get_async_pg
+from app.models import CartItemCreate
+
+PREFIX = "bench-store-"
+
+
+async def cleanup() -> None:
+    pg = get_async_pg()
+    await pg.execute_cmd(
+        """
+        delete from app.order_items where order_id in (
+            select order_id from app.orders where customer_id like %s
+        )
+        """,
+        params=(PREFIX + "%",),
+    )
+    await pg.execute_cmd(
+        "delete from app.orders where customer_id like %s", params=(PREFIX + "%",)
+    )
+
+
+async def timed(label: str, count: int, coros) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*coros)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<5} {count:>7} in {elapsed:7.2f} s  {count / elapsed:>10,.0f} ops/sec")
+    return count / elapsed
+
+
+async def run_store(
+    name: str, store: CartStore, customers: int, adds: int, views: int, concurrency: int
+) -> bool:
+    product = await get_async_pg().execute_query(
+        "select license_id, license_name from app.production limit 1", first=True
+    )
+    if not product:
+        print("app.production 沒有商品資料, 無法測試")
+        return False
+    await cleanup()
+    await store.start()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def add(customer: int, n: int) -> None:
+        item = CartItemCreate(
+            license_id=product.license_id,
+            license_name=product.license_name or "",
+            quantity=n % 3 + 1,
+            price_at_order_time=100 + n,
+            created_by="benchmark",
+        )
+        async with semaphore:
+            await store.add_item(f"{PREFIX}{customer}", "bench", item)
+
+    async def view(customer: int) -> None:
+        async with semaphore:
+            await store.get(f"{PREFIX}{customer}")
+
+    print(name)
+    # 每位客戶的 add 依序送出, 不同客戶之間併發
+    async def add_all(customer: int) -> None:
+        for n in range(adds):
+            await add(customer, n)
+
+    await timed("add", customers * adds, (add_all(c) for c in range(customers)))
+    await timed(
+        "view",
+        customers * views,
+        (view(c) for c in range(customers) for _ in range(views)),
+    )
+    start = time.perf_counter()
+    await store.close()
+    print(f"  flush {time.perf_counter() - start:7.2f} s")
+
+    for c in range(customers):
+        await store.checkout(f"{PREFIX}{c}")
+    rows = await get_async_pg().execute_query(
+        """
+        select o.customer_id, o.total_amount,
+            coalesce(sum(i.quantity * i.price_at_order_time), 0) as items_amount,
+            count(i.id) as items
+        from app.orders o left join app.order_items i on i.order_id = o.order_id
+        where o.customer_id like %s and not o.status
+        group by o.order_id
+        """,
+        params=(PREFIX + "%",),
+    )
+    expected_amount = sum((n % 3 + 1) * (100 + n) for n in range(adds))
+    ok = len(rows) == customers
+    for row in rows:
+        if (
+            row.items != adds
+            or row.total_amount != row.items_amount
+            or row.total_amount != expected_amount
+        ):
+            ok = False
+            print(f"  MISMATCH {row}")
+    print("  totals correct" if ok else "  totals INCORRECT")
+    await cleanup()
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, default=50)
+    parser.add_argument("--adds", type=int, default=40, help="每位客戶加入的商品數")
+    parser.add_argument("--views", type=int, default=4, help="每位客戶查看購物車的次數")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        default=["database", "write_behind", "checkout"],
+        choices=["database", "write_behind", "checkout"],
+    )
+    parser.add_argument("--flush-interval", type=float, default=2.0)
+    args = parser.parse_args()
+
+    async def _main() -> bool:
+        await db.startup()
+        ok = True
+        try:
+            for mode in args.modes:
+                if mode == "database":
+                    store: CartStore = DatabaseCartStore()
+                else:
+                    store = MemoryCartStore(
+                        mode=mode, flush_interval=args.flush_interval, idle_ttl=3600
+                    )
+                ok &= await run_store(
+                    mode, store, args.customers, args.adds, args.views, args.concurrency
+                )
+        finally:
+            await db.shutdown()
+        return ok
+
+    sys.exit(0 if asyncio.run(_main()) else 1)
+
+
+if __name__ == "__main__":
+    main()
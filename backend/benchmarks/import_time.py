@@ -0,0 +1,114 @@
+'''
+app.main 冷啟動 import 時間
+以 python -X importtime 在新的 process 中 import app.main (可重複多次取最小值),
+解析 stderr 列出自身耗時 (self) 與累計耗時 (cumulative) 最久的模組。
+同時作為回歸檢查: app.main 的累計 import 時間超過預算則以 exit code 1 結束,
+預算預設為 .env 的 IMPORT_BUDGET_MS, 可用 --budget-ms 覆蓋 (0 表示不檢查)。
+tests/test_import_time.py 以相同的預算在 pytest 中檢查。於 backend 目錄執行:
+    python -m benchmarks.import_time --top 20
+    python -m benchmarks.import_time --runs 5 --budget-ms 1500
+'''
+
+import argparse
+import re
+import subprocess
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+from app.core.config import settings
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+@dataclass
+class ImportRecord:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def profile(module: str) -> list[ImportRecord]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"import {module} failed")
+    records = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            records.append(
+                ImportRecord(name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2)
+            )
+    return records
+
+
+def cumulative_ms(records: list[ImportRecord], module: str) -> float:
+    for record in records:
+        if record.module == module:
+            return record.cumulative_us / 1000
+    return 0.0
+
+
+def top_package(module: str) -> str:
+    return module.split(".")[0]
+
+
+def report(records: list[ImportRecord], top: int) -> None:
+    print(f"\nslowest imports by self time (top {top})")
+    for record in sorted(records, key=lambda r: r.self_us, reverse=True)[:top]:
+        print(f"  {record.self_us / 1000:9.2f} ms  {record.module}")
+
+    print(f"\nslowest imports by cumulative time (top {top})")
+    for record in sorted(records, key=lambda r: r.cumulative_us, reverse=True)[:top]:
+        print(f"  {record.cumulative_us / 1000:9.2f} ms  {'  ' * record.depth}{record.module}")
+
+    # 依第三方套件加總自身耗時, 找出值得延後載入的套件
+    packages: dict[str, int] = {}
+    for record in records:
+        name = top_package(record.module)
+        packages[name] = packages.get(name, 0) + record.self_us
+    print(f"\nslowest packages (self time summed, top {top})")
+    for name, us in sorted(packages.items(), key=lambda x: x[1], reverse=True)[:top]:
+        print(f"  {us / 1000:9.2f} ms  {name}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=3, help="重複次數, 取最快的一次")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=settings.IMPORT_BUDGET_MS,
+        help="累計 import 時間上限 (毫秒), 超過時 exit code 1; 預設為 IMPORT_BUDGET_MS",
+    )
+    args = parser.parse_args()
+
+    runs = [profile(args.module) for _ in range(args.runs)]
+    timings = [cumulative_ms(records, args.module) for records in runs]
+    best = min(range(len(runs)), key=lambda i: timings[i])
+    report(runs[best], args.top)
+
+    print(
+        f"\nimport {args.module}: best {timings[best]:.1f} ms "
+        f"(runs: {', '.join(f'{t:.1f}' for t in timings)})"
+    )
+    if args.budget_ms > 0:
+        if timings[best] > args.budget_ms:
+            print(f"FAIL: over budget of {args.budget_ms:.0f} ms")
+            sys.exit(1)
+        print(f"OK: within budget of {args.budget_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+'''
+API 端到端壓力/延遲測試
+啟動 uvicorn app.main:app (或以 --url 指向已啟動的服務), 在 .env 設定的 Postgres
+寫入測試資料 (使用者與商品, id 以 bench-load- 開頭, 結束時刪除), 以多個虛擬使用者依照
+流量組合送出請求, 回報每個 route 的 p50 / p95 / p99 延遲與每秒請求數。
+  --json 輸出機器可讀的結果, --baseline 與先前的結果比較, 任一 route 的 p95 上升或
+  RPS 下降超過 --threshold 時以 exit code 1 結束, 可在部署前發現 DB 層或驗證流程的退化。
+建議使用獨立的測試資料庫 (以 POSTGRES_* 環境變數覆蓋 .env)。
+啟動的服務使用 EMAIL_TRANSPORT=fake, 不會實際寄信, 並放寬登入的流量管制 (AUTH_*),
+所有虛擬使用者都從 127.0.0.1 登入, 否則量到的是 429; 以 --url 測試既有服務時需自行放寬。於 backend 目錄執行:
+    python -m benchmarks.load --mix browse --users 50 --duration 30 --json result.json
+    python -m benchmarks.load --mix checkout --baseline result.json
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+from app.core import security
+from app.core.config import settings
+from app.core.db import db, get_async_pg
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+PREFIX = "bench-load-"
+PASSWORD = "bench-load-password"
+
+# 每種流量組合中各動作的權重
+MIXES: dict[str, dict[str, int]] = {
+    "browse": {"production": 60, "me": 25, "cart_view": 10, "cart_add": 5},
+    "checkout": {
+        "production": 20,
+        "me": 10,
+        "cart_add": 35,
+        "cart_view": 25,
+        "cart_checkout": 10,
+    },
+    "auth": {"login": 40, "me": 40, "recovery": 20},
+    "all": {
+        "login": 5,
+        "me": 20,
+        "production": 30,
+        "cart_add": 15,
+        "cart_view": 15,
+        "cart_checkout": 5,
+        "recovery": 2,
+    },
+}
+
+
+@dataclass
+class RouteStats:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    statuses: dict[int, int] = field(default_factory=dict)
+
+    def add(self, elapsed: float, status: int) -> None:
+        self.latencies.append(elapsed)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status >= 400:
+            self.errors += 1
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(stats: dict[str, RouteStats], elapsed: float) -> dict[str, Any]:
+    routes = {}
+    for name, route in sorted(stats.items()):
+        ms = [v * 1000 for v in route.latencies]
+        routes[name] = {
+            "requests": len(ms),
+            "errors": route.errors,
+            "statuses": {str(k): v for k, v in sorted(route.statuses.items())},
+            "rps": round(len(ms) / elapsed, 2),
+            "mean_ms": round(sum(ms) / len(ms), 2) if ms else 0.0,
+            "p50_ms": round(percentile(ms, 50), 2),
+            "p95_ms": round(percentile(ms, 95), 2),
+            "p99_ms": round(percentile(ms, 99), 2),
+            "max_ms": round(max(ms), 2) if ms else 0.0,
+        }
+    total = sum(r["requests"] for r in routes.values())
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "total_requests": total,
+        "total_rps": round(total / elapsed, 2),
+        "routes": routes,
+    }
+
+
+async def seed(users: int, products: int) -> None:
+    await cleanup()
+    pg = get_async_pg()
+    # 所有測試帳號共用同一組密碼, 只需計算一次 bcrypt
+    hashed = security.get_password_hash(PASSWORD)
+    now = datetime.now(timezone.utc)
+    await pg.insert_mogrify(
+        "app.customs",
+        (
+            (
+                f"{PREFIX}{i}",
+                f"{PREFIX}{i}",
+                f"{PREFIX}{i}@example.com",
+                "0900000000",
+                hashed,
+                "bench address",
+                ["credit_card", "line_pay"],
+                True,
+                now,
+                now,
+                now.date() + timedelta(days=365),
+                0,
+            )
+            for i in range(users)
+        ),
+    )
+    await pg.insert_mogrify(
+        "app.production",
+        (
+            (
+                f"{PREFIX}{i:06d}",
+                f"Bench license {i}",
+                "synthetic product for load testing",
+                (now + timedelta(days=30 + i % 90)).date().isoformat(),
+                str(1000 + i % 50 * 100),
+                ["Taipei", "Taichung", "Kaohsiung"][i % 3],
+                now - timedelta(days=10),
+                now + timedelta(days=20),
+                1,
+                now - timedelta(minutes=i),
+                None,
+            )
+            for i in range(products)
+        ),
+    )
+
+
+async def cleanup() -> None:
+    pg = get_async_pg()
+    like = (PREFIX + "%",)
+    await pg.execute_cmd(
+        """
+        delete from app.order_items where order_id in (
+            select order_id from app.orders where customer_id like %s
+        )
+        """,
+        params=like,
+    )
+    await pg.execute_cmd("delete from app.orders where customer_id like %s", params=like)
+    await pg.execute_cmd("delete from app.email_outbox where email_to like %s", params=like)
+    await pg.execute_cmd("delete from app.customs where customer_id like %s", params=like)
+    await pg.execute_cmd(
+        "delete from app.production where license_id like %s", params=like
+    )
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, index: int, products: int) -> None:
+        self.client = client
+        self.customer_id = f"{PREFIX}{index}"
+        self.email = f"{PREFIX}{index}@example.com"
+        self.products = products
+        self.headers: dict[str, str] = {}
+
+    async def login(self) -> httpx.Response:
+        res = await self.client.post(
+            f"{settings.API_V1_STR}/login/access-token",
+            data={"username": self.email, "password": PASSWORD},
+        )
+        if res.status_code == 200:
+            # cookie 設定為 secure, 以 http 測試時自行帶入 header
+            access_token = res.cookies.get("access_token")
+            csrf_token = res.json()["csrf_token"]
+            self.headers = {
+                "Cookie": f"access_token={access_token}; csrf_token={csrf_token}",
+                "X-CSRF-Token": csrf_token,
+            }
+        return res
+
+    async def me(self) -> httpx.Response:
+        return await self.client.get(
+            f"{settings.API_V1_STR}/users/me", headers=self.headers
+        )
+
+    async def production(self) -> httpx.Response:
+        return await self.client.get(f"{settings.API_V1_STR}/production")
+
+    async def cart_add(self) -> httpx.Response:
+        n = random.randrange(self.products)
+        return await self.client.post(
+            f"{settings.API_V1_STR}/cart/add",
+            params={"customer_id": self.customer_id, "customer_name": self.customer_id},
+            json={
+                "license_id": f"{PREFIX}{n:06d}",
+                "license_name": f"Bench license {n}",
+                "quantity": 1,
+                "price_at_order_time": 1000,
+                "created_by": "benchmark",
+            },
+        )
+
+    async def cart_view(self) -> httpx.Response:
+        return await self.client.get(f"{settings.API_V1_STR}/cart/{self.customer_id}")
+
+    async def cart_checkout(self) -> httpx.Response:
+        return await self.client.post(
+            f"{settings.API_V1_STR}/cart/{self.customer_id}/checkout"
+        )
+
+    async def recovery(self) -> httpx.Response:
+        return await self.client.post(
+            f"{settings.API_V1_STR}/login/password-recovery", json={"email": self.email}
+        )
+
+
+async def drive(
+    base_url: str, mix: dict[str, int], users: int, products: int, duration: float, warmup: float
+) -> dict[str, Any]:
+    stats: dict[str, RouteStats] = {}
+    actions = list(mix)
+    weights = [mix[a] for a in actions]
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        vusers = [VirtualUser(client, i, products) for i in range(users)]
+        await asyncio.gather(*(v.login() for v in vusers))
+
+        start = time.perf_counter()
+        measure_from = start + warmup
+        stop_at = measure_from + duration
+
+        async def loop(vuser: VirtualUser) -> None:
+            while True:
+                action = random.choices(actions, weights)[0]
+                call: Callable[[], Awaitable[httpx.Response]] = getattr(vuser, action)
+                t0 = time.perf_counter()
+                if t0 >= stop_at:
+                    return
+                try:
+                    status = (await call()).status_code
+                except httpx.HTTPError:
+                    status = 599
+                t1 = time.perf_counter()
+                if t0 >= measure_from:
+                    stats.setdefault(action, RouteStats()).add(t1 - t0, status)
+
+        await asyncio.gather(*(loop(v) for v in vusers))
+    return summarize(stats, duration)
+
+
+def print_report(result: dict[str, Any]) -> None:
+    print(
+        f"{'route':<15}{'reqs':>8}{'errors':>8}{'rps':>10}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    )
+    for name, r in result["routes"].items():
+        print(
+            f"{name:<15}{r['requests']:>8}{r['errors']:>8}{r['rps']:>10.1f}"
+            f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}"
+        )
+    print(f"total {result['total_requests']} requests, {result['total_rps']:.1f} req/sec")
+
+
+def compare(result: dict[str, Any], baseline: dict[str, Any], threshold: float) -> bool:
+    """p95 上升或 RPS 下降超過 threshold (%) 視為退化"""
+    ok = True
+    print(f"\n{'route':<15}{'p95 base':>10}{'p95 now':>10}{'diff':>9}{'rps base':>10}{'rps now':>10}{'diff':>9}")
+    for name, now in result["routes"].items():
+        base = baseline["routes"].get(name)
+        if base is None:
+            print(f"{name:<15} (not in baseline)")
+            continue
+        p95_diff = (now["p95_ms"] / base["p95_ms"] - 1) * 100 if base["p95_ms"] else 0.0
+        rps_diff = (now["rps"] / base["rps"] - 1) * 100 if base["rps"] else 0.0
+        regressed = p95_diff > threshold or rps_diff < -threshold
+        ok &= not regressed
+        print(
+            f"{name:<15}{base['p95_ms']:>10.1f}{now['p95_ms']:>10.1f}{p95_diff:>+8.1f}%"
+            f"{base['rps']:>10.1f}{now['rps']:>10.1f}{rps_diff:>+8.1f}%"
+            + ("  REGRESSION" if regressed else "")
+        )
+    return ok
+
+
+def start_server(port: int, workers: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "EMAIL_TRANSPORT": "fake",
+        # 測量 bcrypt 與 DB 的成本, 不是 app/core/admission.py 的拒絕
+        "AUTH_IP_RATE": "1000000",
+        "AUTH_IP_BURST": "1000000",
+        "AUTH_EMAIL_RATE": "1000000",
+        "AUTH_EMAIL_BURST": "1000000",
+        "AUTH_MAX_CONCURRENT": "100000",
+        "RATE_LIMIT_BACKEND": "memory",
+    }
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning",
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+
+
+async def wait_ready(base_url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                res = await client.get(f"{settings.API_V1_STR}/utils/db-pool/")
+                if res.status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise TimeoutError(f"Server at {base_url} not ready after {timeout:.0f} s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--mix", default="all", choices=sorted(MIXES))
+    parser.add_argument(
+        "--weights", help="自訂流量組合, 例如 production=70,me=30 (覆蓋 --mix)"
+    )
+    parser.add_argument("--users", type=int, default=50, help="虛擬使用者數")
+    parser.add_argument("--products", type=int, default=2000, help="測試商品數")
+    parser.add_argument("--duration", type=float, default=30.0, help="量測秒數")
+    parser.add_argument("--warmup", type=float, default=5.0, help="不列入統計的暖機秒數")
+    parser.add_argument("--url", help="已啟動的服務位址, 未指定時自行啟動 uvicorn")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="自行啟動時的 worker 數")
+    parser.add_argument("--json", type=Path, help="結果輸出為 JSON 檔")
+    parser.add_argument("--baseline", type=Path, help="與先前 --json 的結果比較")
+    parser.add_argument("--threshold", type=float, default=10.0, help="退化門檻 (%%)")
+    parser.add_argument("--keep", action="store_true", help="結束後保留測試資料")
+    args = parser.parse_args()
+
+    mix = MIXES[args.mix]
+    if args.weights:
+        mix = {k: int(v) for k, v in (p.split("=") for p in args.weights.split(","))}
+        unknown = set(mix) - {a for m in MIXES.values() for a in m}
+        if unknown:
+            parser.error(f"unknown actions: {', '.join(sorted(unknown))}")
+
+    async def _main() -> bool:
+        await db.startup()
+        server = None
+        try:
+            await seed(args.users, args.products)
+            base_url = args.url
+            if base_url is None:
+                server = start_server(args.port, args.workers)
+                base_url = f"http://127.0.0.1:{args.port}"
+            await wait_ready(base_url)
+            result = await drive(
+                base_url, mix, args.users, args.products, args.duration, args.warmup
+            )
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+            if not args.keep:
+                await cleanup()
+            await db.shutdown()
+
+        result["config"] = {
+            "mix": mix,
+            "users": args.users,
+            "products": args.products,
+            "duration": args.duration,
+            "workers": args.workers if args.url is None else None,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+        }
+        print_report(result)
+        if args.json:
+            args.json.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+        if args.baseline:
+            return compare(result, json.loads(args.baseline.read_text()), args.threshold)
+        return True
+
+    sys.exit(0 if asyncio.run(_main()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+'''
+prepared statement 效能比較
+比較 crud 查詢三種寫法每次呼叫的平均耗時:
+  literal  : 以 f-string 把值拼進 SQL (舊寫法, 每次都要 parse/plan)
+  params   : 參數化查詢, 不 prepare
+  prepared : 參數化查詢 + server 端 prepared statement
+需要可連線的 Postgres (.env 設定), 於 backend 目錄執行:
+    python -m benchmarks.prepared_statements --n 2000
+'''
+
+import argparse
+import asyncio
+import time
+
+from app.core.db import db, get_async_pg
+from app.core.pg_engine import PsqlEngine
+from app.crud import GET_USER_BY_EMAIL
+
+
+def report(name: str, n: int, elapsed: float, baseline: float | None) -> None:
+    per_call = elapsed / n * 1_000_000
+    line = f"{name:<18}{per_call:>10.1f} us/call"
+    if baseline:
+        line += f"{(1 - elapsed / baseline) * 100:>8.1f}% saved"
+    print(line)
+
+
+async def bench_async(emails: list[str], n: int) -> None:
+    pg = get_async_pg()
+    variants = {
+        "async literal": lambda e: pg.execute_query(
+            f"select * from app.customs where email = '{e}'", first=True
+        ),
+        "async params": lambda e: pg.execute_query(
+            GET_USER_BY_EMAIL, first=True, params=(e,), prepare=False
+        ),
+        "async prepared": lambda e: pg.execute_query(
+            GET_USER_BY_EMAIL, first=True, params=(e,), prepare=True
+        ),
+    }
+    baseline = None
+    for name, call in variants.items():
+        # 暖身: 讓連線池與 prepared statement 都就緒
+        for email in emails[:10]:
+            await call(email)
+        start = time.perf_counter()
+        for i in range(n):
+            await call(emails[i % len(emails)])
+        elapsed = time.perf_counter() - start
+        report(name, n, elapsed, baseline)
+        baseline = baseline or elapsed
+
+
+def bench_sync(emails: list[str], n: int) -> None:
+    variants = {
+        "sync literal": lambda e: PsqlEngine().execute_query(
+            f"select * from app.customs where email = '{e}'", first=True
+        ),
+        "sync params": lambda e: PsqlEngine().execute_query(
+            GET_USER_BY_EMAIL, first=True, params=(e,)
+        ),
+        "sync prepared": lambda e: PsqlEngine().execute_query(
+            GET_USER_BY_EMAIL, first=True, params=(e,), prepare=True
+        ),
+    }
+    baseline = None
+    for name, call in variants.items():
+        for email in emails[:10]:
+            call(email)
+        start = time.perf_counter()
+        for i in range(n):
+            call(emails[i % len(emails)])
+        elapsed = time.perf_counter() - start
+        report(name, n, elapsed, baseline)
+        baseline = baseline or elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=2000, help="每種寫法的呼叫次數")
+    args = parser.parse_args()
+
+    rows = await get_async_pg().execute_query(
+        "select email from app.customs limit 100"
+    )
+    # 沒有使用者資料時改用不存在的 email, 仍然會經過 parse/plan
+    emails = [row.email for row in rows] or [f"bench{i}@example.com" for i in range(100)]
+    await bench_async(emails, args.n)
+    bench_sync(emails, args.n)
+    await db.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
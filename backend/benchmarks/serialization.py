@@ -0,0 +1,117 @@
+'''
+回應序列化比較
+以合成的 Production 與 CartResponse 資料, 比較每 1000 筆的序列化時間:
+  fastapi   : response_model 驗證 + jsonable_encoder + json.dumps (FastAPI 預設流程)
+  orjson    : response_model 驗證 + jsonable_encoder + orjson.dumps (ORJSONResponse)
+  adapter   : TypeAdapter.validate_python + dump_json (json_response(validate=True))
+  dump_json : TypeAdapter.dump_json, 不重新驗證 (json_response 預設)
+不需要資料庫。於 backend 目錄執行:
+    python -m benchmarks.serialization --rows 5000 --repeat 5
+'''
+
+import argparse
+import json
+import timeit
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.core.serialization import cart_response_adapter, production_list_adapter
+from app.models import CartResponse, OrderItem, Production
+
+
+def make_productions(n: int) -> list[Production]:
+    now = datetime.now()
+    return [
+        Production(
+            license_id=f"LIC-{i:06d}",
+            license_name=f"License {i}",
+            license_info="synthetic product for serialization benchmark " * 4,
+            exam_date=(now + timedelta(days=i % 90)).date().isoformat(),
+            price=str(1000 + i % 50 * 100),
+            exam_location=["Taipei", "Taichung", "Kaohsiung"][i % 3],
+            registration_start=now - timedelta(days=10),
+            registration_end=now + timedelta(days=20),
+            display_status=1,
+            created_at=now - timedelta(minutes=i),
+            picture_url=f"/api/images/card/0123456789abcdef/LIC-{i:06d}.webp",
+        )
+        for i in range(n)
+    ]
+
+
+def make_cart(n: int) -> CartResponse:
+    now = datetime.now()
+    return CartResponse(
+        order_id=1,
+        customer_id="bench",
+        customer_name="bench",
+        status=True,
+        total_amount=1000 * n,
+        comment="新購物車",
+        items=[
+            OrderItem(
+                id=i,
+                order_id=1,
+                license_id=f"LIC-{i:06d}",
+                license_name=f"License {i}",
+                quantity=1,
+                price_at_order_time=1000,
+                created_by="benchmark",
+                created_date=now,
+            )
+            for i in range(n)
+        ],
+    )
+
+
+def strategies(adapter: TypeAdapter, value: Any) -> dict[str, Callable[[], Any]]:
+    def validate() -> Any:
+        return adapter.validate_python(value, from_attributes=True)
+
+    return {
+        "fastapi": lambda: json.dumps(jsonable_encoder(validate())).encode(),
+        "orjson": lambda: orjson.dumps(jsonable_encoder(validate())),
+        "adapter": lambda: adapter.dump_json(validate()),
+        "dump_json": lambda: adapter.dump_json(value),
+    }
+
+
+def run(name: str, adapter: TypeAdapter, value: Any, rows: int, repeat: int) -> None:
+    print(f"\n{name} ({rows} rows)")
+    baseline = None
+    for label, fn in strategies(adapter, value).items():
+        fn()
+        best = min(timeit.repeat(fn, number=1, repeat=repeat))
+        per_1k = best / rows * 1000 * 1000
+        baseline = baseline or per_1k
+        print(f"  {label:<10} {per_1k:9.2f} ms / 1k rows  {baseline / per_1k:6.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    run(
+        "list[Production]",
+        production_list_adapter,
+        make_productions(args.rows),
+        args.rows,
+        args.repeat,
+    )
+    run(
+        "CartResponse.items",
+        cart_response_adapter,
+        make_cart(args.rows),
+        args.rows,
+        args.repeat,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+'''
+app.main 冷啟動 import 時間不可超過 IMPORT_BUDGET_MS (benchmarks/import_time.py)
+於 backend 目錄執行:
+    python -m pytest tests/test_import_time.py
+'''
+
+from app.core.config import settings
+from benchmarks.import_time import cumulative_ms, profile
+
+MODULE = "app.main"
+RUNS = 3
+
+
+def test_app_main_import_within_budget() -> None:
+    # 取多次中最快的一次, 排除磁碟快取等一次性的干擾
+    timings = [cumulative_ms(profile(MODULE), MODULE) for _ in range(RUNS)]
+    best = min(timings)
+    assert best > 0, f"{MODULE} was not found in the -X importtime output"
+    assert best <= settings.IMPORT_BUDGET_MS, (
+        f"import {MODULE} took {best:.1f} ms, over the budget of "
+        f"{settings.IMPORT_BUDGET_MS:.0f} ms (runs: {', '.join(f'{t:.1f}' for t in timings)})"
+    )
@@ -8,6 +8,9 @@ PORT="8000"
 APP_PATH="/home/omni/Cert_POC/backend/app/main.py"
 LOG_DIR="/home/omni/Cert_POC/logs"
 LOG_FILE="$LOG_DIR/fastapi.log"
+# prod: python -m app.serve 多 worker (worker 數與連線數見 .env 的 SERVE_WORKERS / DB_CONNECTION_BUDGET)
+# dev: fastapi dev, 單一 process 並自動重新載入
+MODE="${1:-prod}"
 PID_FILE="$LOG_DIR/fastapi.pid"
 
 # 顏色輸出
@@ -66,6 +69,7 @@ check_port() {
     if lsof -i :$PORT > /dev/null 2>&1; then
         warning "端口 $PORT 已被佔用，嘗試停止現有服務..."
         pkill -f "fastapi.*$PORT" || true
+        pkill -f "app.serve.*$PORT" || true
         sleep 2
         if lsof -i :$PORT > /dev/null 2>&1; then
             error "無法釋放端口 $PORT，請手動停止佔用的程序"
@@ -85,7 +89,11 @@ start_service() {
 
     log "啟動 FastAPI 服務..."
     cd $BACKEND_DIR
-    nohup fastapi dev "$APP_PATH" --host "$HOST" --port "$PORT" > "$LOG_FILE" 2>&1 &
+    if [ "$MODE" = "dev" ]; then
+        nohup fastapi dev "$APP_PATH" --host "$HOST" --port "$PORT" > "$LOG_FILE" 2>&1 &
+    else
+        nohup python -m app.serve --host "$HOST" --port "$PORT" > "$LOG_FILE" 2>&1 &
+    fi
     #echo "nohup fastapi dev "$APP_PATH" --host "$HOST" --port "$PORT" > "$LOG_FILE" 2>&1 &"
     # 獲取程序 PID
     FASTAPI_PID=$!
@@ -93,6 +101,7 @@ start_service() {
 
     log "FastAPI 服務已在背景啟動"
     log "PID: $FASTAPI_PID"
+    log "模式: $MODE"
     log "主機: $HOST"
     log "端口: $PORT"
     log "日誌檔案: $LOG_FILE"
@@ -108,7 +117,8 @@ verify_service() {
     local spinner_index=0
 
     while [ $attempt -le $max_attempts ]; do
-        if curl -s "http://$HOST:$PORT" > /dev/null 2>&1; then
+        # /ready 在連線池預熱完成後才回 200
+        if curl -sf "http://$HOST:$PORT/ready" > /dev/null 2>&1; then
             echo -ne "\r"
             success "FastAPI 服務啟動成功！"
             success "訪問地址: http://$HOST:$PORT"